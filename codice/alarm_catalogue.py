@@ -0,0 +1,183 @@
+# alarm_catalogue.py
+
+import json
+import marshal
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), "files")
+CONTROLLER_FILE = os.path.join(FILES_DIR, "alarm_controller.json")
+SERVO_FILE = os.path.join(FILES_DIR, "alarm_servo.json")
+CACHE_FILE = os.path.join(FILES_DIR, "__pycache__", "alarm_catalogue.marshal")
+_CACHE_VERSION = 1
+
+SOURCE_CONTROLLER = "controller"
+SOURCE_SERVO = "servo"
+COLLISION_ID = -2               # reported by GetErrorID on collision, not in the alarm files
+DEFAULT_LANGUAGE = "en"
+
+
+class Alarm(NamedTuple):
+    """One entry of the Dobot alarm files."""
+    id: int
+    level: int
+    source: str                 # SOURCE_CONTROLLER or SOURCE_SERVO
+    texts: dict                 # language -> {"description", "cause", "solution"}
+
+    def text(self, field: str, language: str = DEFAULT_LANGUAGE) -> str:
+        """Field in the requested language, falling back to English."""
+        entry = self.texts.get(language) or self.texts.get(DEFAULT_LANGUAGE) or {}
+        return entry.get(field, "")
+
+    def description(self, language: str = DEFAULT_LANGUAGE) -> str:
+        return self.text("description", language)
+
+    def cause(self, language: str = DEFAULT_LANGUAGE) -> str:
+        return self.text("cause", language)
+
+    def solution(self, language: str = DEFAULT_LANGUAGE) -> str:
+        return self.text("solution", language)
+
+
+COLLISION_ALARM = Alarm(COLLISION_ID, 0, SOURCE_CONTROLLER, {
+    "en": {"description": "Collision detected", "cause": "", "solution": "Clear the alarm and move the arm away"},
+    "it": {"description": "Robot in collisione", "cause": "", "solution": "Ripulire l'errore e allontanare il braccio"},
+})
+
+
+class AlarmCatalogue:
+    """
+    Controller and servo alarms indexed by id and by level, loaded once on first use.
+
+    The JSON files are parsed only when the marshal cache is missing or older than them;
+    the cache (plain dicts and lists, about 160 kB) loads several times faster.
+    Ids that appear more than once keep their first entry, as the old linear search did.
+    """
+
+    def __init__(self, controller_file: str = CONTROLLER_FILE, servo_file: str = SERVO_FILE,
+                 cache_file: Optional[str] = CACHE_FILE):
+        self.controller_file = controller_file
+        self.servo_file = servo_file
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._by_id: Optional[Dict[str, Dict[int, Alarm]]] = None
+        self._by_level: Dict[str, Dict[int, List[Alarm]]] = {}
+        self.languages: tuple = ()
+
+    # --- loading ---
+
+    def _read_sources(self) -> dict:
+        sources = {}
+        for source, path in ((SOURCE_CONTROLLER, self.controller_file), (SOURCE_SERVO, self.servo_file)):
+            with open(path, encoding='utf-8') as f:
+                sources[source] = json.load(f)
+        return sources
+
+    def _cache_key(self) -> tuple:
+        return (_CACHE_VERSION, os.path.getmtime(self.controller_file), os.path.getmtime(self.servo_file))
+
+    def _read_cache(self) -> Optional[dict]:
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'rb') as f:
+                key, sources = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return sources if tuple(key) == self._cache_key() else None
+
+    def _write_cache(self, sources: dict):
+        if self.cache_file is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(marshal.dumps((self._cache_key(), sources)))
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass                # the cache is only an optimisation
+
+    def load(self):
+        """Build the indexes (no-op after the first call)."""
+        if self._by_id is not None:
+            return
+        with self._lock:
+            if self._by_id is not None:
+                return
+            sources = self._read_cache()
+            if sources is None:
+                sources = self._read_sources()
+                self._write_cache(sources)
+
+            by_id: Dict[str, Dict[int, Alarm]] = {}
+            by_level: Dict[str, Dict[int, List[Alarm]]] = {}
+            languages = set()
+            for source, entries in sources.items():
+                ids, levels = {}, {}
+                for item in entries:
+                    texts = {k: v for k, v in item.items() if isinstance(v, dict)}
+                    languages.update(texts)
+                    alarm = Alarm(int(item["id"]), int(item.get("level", 0)), source, texts)
+                    ids.setdefault(alarm.id, alarm)
+                    levels.setdefault(alarm.level, []).append(alarm)
+                by_id[source] = ids
+                by_level[source] = levels
+            self._by_level = by_level
+            self.languages = tuple(sorted(languages))
+            self._by_id = by_id
+
+    # --- lookup ---
+
+    def get(self, alarm_id: int, source: Optional[str] = None) -> Optional[Alarm]:
+        """
+        Alarm with the given id. Without source the controller alarms are searched first and then
+        the servo alarms, as the old error thread did. The collision id -2 is also known.
+        """
+        self.load()
+        if alarm_id == COLLISION_ID and source in (None, SOURCE_CONTROLLER):
+            return COLLISION_ALARM
+        if source is not None:
+            return self._by_id[source].get(alarm_id)
+        return self._by_id[SOURCE_CONTROLLER].get(alarm_id) or self._by_id[SOURCE_SERVO].get(alarm_id)
+
+    def by_level(self, level: int, source: Optional[str] = None) -> List[Alarm]:
+        """All the alarms of a level (of one source, or of both)."""
+        self.load()
+        sources = (source,) if source is not None else (SOURCE_CONTROLLER, SOURCE_SERVO)
+        return [a for s in sources for a in self._by_level[s].get(level, [])]
+
+    def levels(self, source: Optional[str] = None) -> List[int]:
+        self.load()
+        sources = (source,) if source is not None else (SOURCE_CONTROLLER, SOURCE_SERVO)
+        return sorted({level for s in sources for level in self._by_level[s]})
+
+    def describe(self, alarm_id: int, language: str = DEFAULT_LANGUAGE, source: Optional[str] = None) -> str:
+        """Description of an alarm in the requested language (English fallback), or a placeholder."""
+        alarm = self.get(alarm_id, source)
+        if alarm is None:
+            return f"Allarme sconosciuto ({alarm_id})"
+        return alarm.description(language)
+
+    def __contains__(self, alarm_id: int) -> bool:
+        return self.get(alarm_id) is not None
+
+    def __len__(self) -> int:
+        self.load()
+        return sum(len(ids) for ids in self._by_id.values())
+
+
+_catalogue: Optional[AlarmCatalogue] = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> AlarmCatalogue:
+    """Process-wide catalogue, created and loaded on first use."""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = AlarmCatalogue()
+    _catalogue.load()
+    return _catalogue
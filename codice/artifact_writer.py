@@ -0,0 +1,188 @@
+# artifact_writer.py
+
+import os
+import queue
+import struct
+import threading
+import zlib
+from datetime import datetime
+from typing import Callable, Optional
+
+import numpy as np
+
+try:
+    import cv2      # optional: faster PNG and JPEG encoding
+except ImportError:
+    cv2 = None
+
+ARTIFACTS_DIR = "crop_sensing/data"
+ARTIFACT_QUEUE_SIZE = 8         # pending artifacts; when full, new ones are dropped
+DEFAULT_CODEC = "png"
+DEFAULT_COMPRESSION = 1         # PNG/zlib level 0-9 (1 = fast, good enough for debug images)
+JPEG_QUALITY = 90
+CODECS = ("png", "jpg", "npy", "npz")
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def encode_png(image: np.ndarray, compression: int = DEFAULT_COMPRESSION, bgr: bool = True) -> bytes:
+    """
+    Encode a uint8/uint16 image (H, W), (H, W, 3) or (H, W, 4) as PNG with zlib only.
+    With bgr=True the channels are in OpenCV/ZED order (BGR[A]) and are swapped to RGB[A].
+    """
+    image = np.asarray(image)
+    if image.dtype == np.bool_:
+        image = image.astype(np.uint8) * 255
+    if image.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Tipo immagine non supportato per PNG: {image.dtype}")
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[:, :, 0]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    color_type = {1: 0, 3: 2, 4: 6}.get(channels)
+    if color_type is None:
+        raise ValueError(f"Numero di canali non supportato per PNG: {channels}")
+    if bgr and channels >= 3:
+        image = image[:, :, [2, 1, 0] + ([3] if channels == 4 else [])]
+
+    h, w = image.shape[:2]
+    rows = np.ascontiguousarray(image, dtype=image.dtype.newbyteorder('>')).view(np.uint8).reshape(h, -1)
+    raw = np.empty((h, rows.shape[1] + 1), dtype=np.uint8)
+    raw[:, 0] = 0               # filter type "None" on every row
+    raw[:, 1:] = rows
+    header = struct.pack(">IIBBBBB", w, h, image.dtype.itemsize * 8, color_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)) + _png_chunk(b"IEND", b""))
+
+
+def write_artifact(path: str, data: np.ndarray, codec: str = DEFAULT_CODEC, compression: int = DEFAULT_COMPRESSION,
+                   bgr: bool = True) -> str:
+    """
+    Encode and write one array; the codec extension is appended to path. Returns the written path.
+    Boolean masks are written as 0/255 uint8 images. Raises if the encoder fails.
+    """
+    path = f"{path}.{codec}"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if codec in ("png", "jpg") and np.asarray(data).dtype == np.bool_:
+        data = np.asarray(data).astype(np.uint8) * 255      # OpenCV does not accept bool arrays
+    if codec == "npy":
+        np.save(path, data)
+    elif codec == "npz":
+        np.savez_compressed(path, data=data)
+    elif codec == "png":
+        if cv2 is not None:
+            img = data if bgr or np.ndim(data) == 2 else cv2.cvtColor(np.asarray(data), cv2.COLOR_RGB2BGR)
+            if not cv2.imwrite(path, np.asarray(img), [cv2.IMWRITE_PNG_COMPRESSION, compression]):
+                raise RuntimeError(f"OpenCV non ha scritto {path}")
+        else:
+            encoded = encode_png(data, compression, bgr)
+            with open(path, "wb") as f:
+                f.write(encoded)
+    elif codec == "jpg":
+        if cv2 is None:
+            raise RuntimeError("Il codec jpg richiede OpenCV (cv2)")
+        if not cv2.imwrite(path, np.asarray(data), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]):
+            raise RuntimeError(f"OpenCV non ha scritto {path}")
+    else:
+        raise ValueError(f"Codec '{codec}' non supportato, usare uno tra {CODECS}")
+    return path
+
+
+class ArtifactWriter:
+    """
+    Background writer for the debug artifacts of the camera (images, masks, depth maps).
+
+    submit() only enqueues the array; encoding and disk I/O happen in a worker thread. The queue
+    is bounded: when it is full the new artifact is dropped (and counted) instead of blocking the
+    detection. Every scan can get its own timestamped folder with new_scan().
+    Write errors are counted and, if a GUI is set, reported on the error terminal.
+    """
+
+    def __init__(self, base_dir: str = ARTIFACTS_DIR, max_queue: int = ARTIFACT_QUEUE_SIZE,
+                 codec: str = DEFAULT_CODEC, compression: int = DEFAULT_COMPRESSION, per_scan_folders: bool = True,
+                 gui=None):
+        if codec not in CODECS:
+            raise ValueError(f"Codec '{codec}' non supportato, usare uno tra {CODECS}")
+        self.base_dir = base_dir
+        self.codec = codec
+        self.compression = compression
+        self.per_scan_folders = per_scan_folders
+        self.scan_dir = base_dir
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        self.gui = gui                  # MultiTerminalGUI for the error messages (optional)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def new_scan(self, label: str = "", gui=None) -> str:
+        """Start a new timestamped folder (scan_YYYYmmdd_HHMMSS[_label]) for the next artifacts."""
+        if gui is not None:
+            self.gui = gui
+        if not self.per_scan_folders:
+            return self.scan_dir
+        name = datetime.now().strftime("scan_%Y%m%d_%H%M%S") + (f"_{label}" if label else "")
+        self.scan_dir = os.path.join(self.base_dir, name)
+        return self.scan_dir
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ArtifactWriter", daemon=True)
+                self._thread.start()
+
+    def _put(self, job) -> bool:
+        self._start()
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def submit(self, name: str, data: np.ndarray, codec: Optional[str] = None, compression: Optional[int] = None,
+               bgr: bool = True) -> bool:
+        """
+        Queue an array to be written as <scan folder>/<name>.<codec>. The array must not be modified
+        afterwards (pass a copy if the buffer is reused). Returns False if the artifact was dropped.
+        """
+        codec = self.codec if codec is None else codec
+        compression = self.compression if compression is None else compression
+        path = os.path.join(self.scan_dir, name)
+        return self._put((path, lambda: write_artifact(path, data, codec, compression, bgr)))
+
+    def submit_call(self, fn: Callable, *args, **kwargs) -> bool:
+        """Queue a function that writes its own artifact (e.g. find_plant.save_clustered_image)."""
+        return self._put((getattr(fn, "__name__", "artifact"), lambda: fn(*args, **kwargs)))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                name, write = job
+                write()
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                if self.gui is not None:
+                    self.gui.write_to_terminal(4, f"Artifact writer - Errore scrivendo {name}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued artifact has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Write the pending artifacts and stop the worker."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
@@ -0,0 +1,189 @@
+# bbox3d.py
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+def labels_from_masks(masks: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Merge the per-plant binary masks (H, W) into one integer label map:
+    0 is background, i + 1 is the plant of masks[i]. Where masks overlap the later one wins.
+    """
+    if len(masks) == 0:
+        raise ValueError("Nessuna maschera da unire")
+    labels = np.zeros(np.shape(masks[0])[:2], dtype=np.int32)
+    for i, m in enumerate(masks):
+        labels[np.asarray(m) > 0] = i + 1
+    return labels
+
+
+def extract_bboxes(labels: np.ndarray, point_cloud: np.ndarray, n_labels: Optional[int] = None,
+                   trim_percentile: Optional[float] = None) -> np.ndarray:
+    """
+    Compute the 3D bounding box of every label of a label map in a single pass over the point cloud.
+
+    Args:
+        labels: (H, W) integer label map, 0 = background, 1..n_labels = plants.
+        point_cloud: (H, W, 3) or (H, W, 4) XYZ[+colour] cloud aligned with the label map;
+            NaN/inf points (no depth) are ignored.
+        n_labels: number of plants; defaults to labels.max().
+        trim_percentile: if given (e.g. 1.0), the lowest and highest `trim_percentile` percent of
+            each coordinate are discarded per plant, to drop flying pixels on the plant edges.
+
+    Returns:
+        (n_labels, 2, 3) array, [i, 0] = min xyz and [i, 1] = max xyz of plant i + 1,
+        in the unit of the point cloud. Rows of plants without valid points are NaN.
+    """
+    labels = np.asarray(labels)
+    if labels.shape != point_cloud.shape[:2]:
+        raise ValueError(f"Label map {labels.shape} e point cloud {point_cloud.shape[:2]} hanno dimensioni diverse")
+    if n_labels is None:
+        n_labels = int(labels.max(initial=0))
+    boxes = np.full((n_labels, 2, 3), np.nan)
+    if n_labels == 0:
+        return boxes
+
+    lab = labels.reshape(-1)
+    xyz = point_cloud.reshape(-1, point_cloud.shape[-1])[:, :3]
+    valid = (lab > 0) & (lab <= n_labels) & np.isfinite(xyz).all(axis=1)
+    lab = lab[valid]
+    xyz = xyz[valid].astype(np.float64, copy=False)
+    if len(lab) == 0:
+        return boxes
+
+    counts = np.bincount(lab, minlength=n_labels + 1)[1:]
+    present = np.flatnonzero(counts)            # plants with at least one point (label - 1)
+    starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+
+    if trim_percentile is None:
+        order = np.argsort(lab, kind='stable')
+        grouped = xyz[order]
+        boxes[present, 0] = np.minimum.reduceat(grouped, starts, axis=0)
+        boxes[present, 1] = np.maximum.reduceat(grouped, starts, axis=0)
+        return boxes
+
+    # Percentile trim: sort every coordinate inside its plant and take the ranks of the percentiles
+    q = trim_percentile / 100.0
+    n = counts[present]
+    lo = starts + np.floor(q * (n - 1)).astype(np.intp)
+    hi = starts + np.ceil((1.0 - q) * (n - 1)).astype(np.intp)
+    for axis in range(3):
+        order = np.lexsort((xyz[:, axis], lab))
+        values = xyz[order, axis]
+        boxes[present, 0, axis] = values[lo]
+        boxes[present, 1, axis] = values[hi]
+    return boxes
+
+
+def bbox_to_dict(box: np.ndarray) -> Optional[Dict[str, Dict[str, float]]]:
+    """Convert one (2, 3) box to the {"min": {"x", "y", "z"}, "max": {...}} dict of find_plant.get_3d_bbox."""
+    if not np.isfinite(box).all():
+        return None
+    keys = ("x", "y", "z")
+    return {
+        "min": {k: float(v) for k, v in zip(keys, box[0])},
+        "max": {k: float(v) for k, v in zip(keys, box[1])},
+    }
+
+
+# Array-native box formats. Boxes are (N, 2, 3) arrays [min xyz, max xyz]; the flat formats are (N, 6):
+#   COCO       [x_min, y_min, z_min, width, depth, height]
+#   YOLO       [center_x, center_y, center_z, width, depth, height] (absolute values)
+#   PascalVOC  [x_min, y_min, z_min, x_max, y_max, z_max]
+M_TO_MM = 1000.0
+
+
+def as_boxes(boxes) -> np.ndarray:
+    """Return boxes as a float (N, 2, 3) array; a single (2, 3) box becomes (1, 2, 3)."""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    if boxes.shape[-2:] != (2, 3):
+        raise ValueError(f"Le box devono avere forma (N, 2, 3), ricevuto {boxes.shape}")
+    return boxes.reshape(-1, 2, 3)
+
+
+def _as_flat(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] != 6:
+        raise ValueError(f"Le bbox devono avere 6 valori, ricevuto {values.shape}")
+    return values.reshape(-1, 6)
+
+
+def is_valid(boxes) -> np.ndarray:
+    """(N,) bool, True for boxes with finite coordinates."""
+    return np.isfinite(as_boxes(boxes)).all(axis=(1, 2))
+
+
+def to_coco(boxes) -> np.ndarray:
+    boxes = as_boxes(boxes)
+    return np.concatenate([boxes[:, 0], boxes[:, 1] - boxes[:, 0]], axis=1)
+
+
+def to_yolo(boxes) -> np.ndarray:
+    boxes = as_boxes(boxes)
+    return np.concatenate([boxes.mean(axis=1), boxes[:, 1] - boxes[:, 0]], axis=1)
+
+
+def to_pascal_voc(boxes) -> np.ndarray:
+    return as_boxes(boxes).reshape(-1, 6).copy()
+
+
+def from_coco(values) -> np.ndarray:
+    values = _as_flat(values)
+    return np.stack([values[:, :3], values[:, :3] + values[:, 3:]], axis=1)
+
+
+def from_yolo(values) -> np.ndarray:
+    values = _as_flat(values)
+    half = values[:, 3:] / 2.0
+    return np.stack([values[:, :3] - half, values[:, :3] + half], axis=1)
+
+
+def from_pascal_voc(values) -> np.ndarray:
+    return _as_flat(values).reshape(-1, 2, 3).copy()
+
+
+# bbox_type codes used by CameraHandler.scan_and_find_plants
+_TO_FORMAT = {"c": to_coco, "y": to_yolo, "p": to_pascal_voc}
+_FROM_FORMAT = {"c": from_coco, "y": from_yolo, "p": from_pascal_voc}
+
+
+def to_format(boxes, bbox_type: str) -> np.ndarray:
+    """Convert (N, 2, 3) boxes to the (N, 6) format 'c' (COCO), 'y' (YOLO) or 'p' (PascalVOC)."""
+    if bbox_type not in _TO_FORMAT:
+        raise ValueError(f"Invalid bbox_type '{bbox_type}'.")
+    return _TO_FORMAT[bbox_type](boxes)
+
+
+def from_format(values, bbox_type: str) -> np.ndarray:
+    """Convert (N, 6) values in the format 'c', 'y' or 'p' back to (N, 2, 3) boxes."""
+    if bbox_type not in _FROM_FORMAT:
+        raise ValueError(f"Invalid bbox_type '{bbox_type}'.")
+    return _FROM_FORMAT[bbox_type](values)
+
+
+def convert(values, src: str, dst: str) -> np.ndarray:
+    """Convert (N, 6) values from one flat format to another."""
+    return to_format(from_format(values, src), dst)
+
+
+def scale(boxes, factor: float = M_TO_MM) -> np.ndarray:
+    """Change the unit of the boxes (default metres to millimetres)."""
+    return as_boxes(boxes) * factor
+
+
+def corners(boxes) -> np.ndarray:
+    """The 8 vertices of each box, shape (N, 8, 3)."""
+    boxes = as_boxes(boxes)
+    sel = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])    # (8, 3) min/max choice per axis
+    return boxes[:, sel, np.arange(3)]
+
+
+def transform(boxes, matrix: np.ndarray) -> np.ndarray:
+    """
+    Move the boxes into another frame (e.g. camera to robot base) with a 4x4 homogeneous matrix.
+    The 8 vertices are transformed and the result is the axis-aligned box that contains them.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    pts = corners(boxes) @ matrix[:3, :3].T + matrix[:3, 3]
+    return np.stack([pts.min(axis=1), pts.max(axis=1)], axis=1)
@@ -3,19 +3,173 @@
 from crop_sensing import zed_manager, find_plant, create_plc
 import numpy as np
 
+import copy
+import os
+import threading
+from contextlib import contextmanager
+
+import bbox3d
+from artifact_writer import ArtifactWriter
+import plant_detection
+import ply_io
+import voxel_fusion
+from extrinsics import CameraExtrinsics
 from multi_terminal_gui_class import MultiTerminalGUI
 from pose_class import Pose
 
 from typing import Tuple, List, Optional, Dict
 
+ZED_IDLE_TIMEOUT = 60.0     # seconds without leases before the camera is closed automatically
+BBOX_TRIM_PERCENTILE = None # percent of points trimmed per side from the plant boxes
+FRONT_VIEW_DISTANCE = 700.0 # mm, distance of the front viewpoint from the box centre along -y
+FRONT_VIEW_HEIGHT = 700.0   # mm, height of the front viewpoint in the base frame
+POINT_CLOUD_DIR = "crop_sensing/data"   # where create_plc saves <plant_name>.ply
+
+
+class ZedSession:
+    """
+    Keeps the ZED camera open across captures and hands out leases to the callers.
+
+    Grab leases share the open device (several captures pay the initialization once).
+    When no lease is active the camera is closed after `idle_timeout` seconds, unless
+    `warm_standby` is set, in which case it stays open until close() is called.
+
+    Recordings do not reuse the device: create_plc.record_and_save opens the camera itself,
+    so a record lease closes it first and the recording pays its own initialization.
+    """
+
+    def __init__(self, idle_timeout: float = ZED_IDLE_TIMEOUT, warm_standby: bool = False):
+        self.idle_timeout = idle_timeout
+        self.warm_standby = warm_standby
+        self.zed = None                 # ZED camera instance
+        self._leases = 0
+        self._exclusive = False         # a record lease owns the device
+        self._cond = threading.Condition()
+        self._idle_timer: Optional[threading.Timer] = None
+        self._gui: Optional[MultiTerminalGUI] = None
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _arm_idle_timer(self):
+        self._cancel_idle_timer()
+        if self.warm_standby or self.zed is None or self.idle_timeout is None:
+            return
+        self._idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _close_if_idle(self):
+        with self._cond:
+            if self._leases == 0 and not self._exclusive:
+                self._close_locked(self._gui, "idle timeout")
+
+    def _open_locked(self, system_pose: Pose, gui: MultiTerminalGUI):
+        if self.zed is None:
+            try:
+                self.zed = zed_manager.zed_init(system_pose)
+                gui.write_to_terminal(2, "ZED camera initialized.")
+            except Exception as e:
+                gui.write_to_terminal(4, f"Failed to initialize ZED camera: {e}")
+                raise e
+
+    def _close_locked(self, gui: Optional[MultiTerminalGUI], reason: str = ""):
+        if self.zed is None:
+            return
+        try:
+            self.zed.close()
+        except Exception as e:
+            if gui is not None:
+                gui.write_to_terminal(4, f"Failed to close ZED camera: {e}")
+        self.zed = None
+        if gui is not None:
+            gui.write_to_terminal(2, f"ZED camera closed{f' ({reason})' if reason else ''}.")
+
+    @property
+    def is_open(self) -> bool:
+        return self.zed is not None
+
+    def open(self, system_pose: Pose, gui: MultiTerminalGUI):
+        """Open the camera now (e.g. warm standby before a scan)."""
+        with self._cond:
+            self._gui = gui
+            self._cond.wait_for(lambda: not self._exclusive)
+            self._open_locked(system_pose, gui)
+            if self._leases == 0:
+                self._arm_idle_timer()
+
+    def close(self, gui: Optional[MultiTerminalGUI] = None):
+        """Close the camera as soon as no lease is using it."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._leases == 0 and not self._exclusive)
+            self._cancel_idle_timer()
+            self._close_locked(gui)
+
+    @contextmanager
+    def grab_lease(self, system_pose: Pose, gui: MultiTerminalGUI):
+        """Lease the open camera for captures, opening it if needed. Yields the ZED instance."""
+        with self._cond:
+            self._gui = gui
+            self._cond.wait_for(lambda: not self._exclusive)
+            self._cancel_idle_timer()
+            self._open_locked(system_pose, gui)
+            self._leases += 1
+            zed = self.zed
+        try:
+            yield zed
+        finally:
+            with self._cond:
+                self._leases -= 1
+                if self._leases == 0:
+                    self._arm_idle_timer()
+                self._cond.notify_all()
+
+    @contextmanager
+    def record_lease(self, gui: MultiTerminalGUI):
+        """
+        Exclusive lease for a recording: waits for the grab leases to end and closes the device,
+        so that the recorder can open it; no capture can reopen it until the lease ends.
+        """
+        with self._cond:
+            self._gui = gui
+            self._cond.wait_for(lambda: self._leases == 0 and not self._exclusive)
+            self._cancel_idle_timer()
+            self._exclusive = True
+            self._close_locked(gui, "handed over to the recorder")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._arm_idle_timer()
+                self._cond.notify_all()
+
 
 class CameraHandler:
     """
     Class to manage the ZED camera and the extraction of 3D bounding boxes of plants.
+    The camera stays open between captures through a ZedSession.
     """
 
-    def __init__(self):
-        self.zed = None  # ZED camera instance
+    def __init__(self, idle_timeout: float = ZED_IDLE_TIMEOUT, warm_standby: bool = False,
+                 trim_percentile: Optional[float] = BBOX_TRIM_PERCENTILE, binary_ply: bool = True,
+                 voxel_size: Optional[float | str] = voxel_fusion.AUTO_VOXEL_SIZE,
+                 detection_scale: int = plant_detection.DETECTION_SCALE, save_debug: bool = True):
+        self.session = ZedSession(idle_timeout, warm_standby)
+        self.trim_percentile = trim_percentile     # outlier trim of the 3D boxes (None = plain min/max)
+        self.extrinsics = CameraExtrinsics()        # camera-to-robot transforms (hand-eye from files/hand_eye.npy, check .calibrated)
+        self.binary_ply = binary_ply                # convert the recorded point clouds to binary PLY
+        self.voxel_size = voxel_size                # voxel of the fused cloud <plant>_fused.ply (AUTO_VOXEL_SIZE = from the point spacing, None = no fusion)
+        self.detection_scale = detection_scale      # coarse detection at 1/detection_scale (1 = full resolution)
+        self.save_debug = save_debug                # save image, depth, filter and cluster debug artifacts
+        self.artifacts = ArtifactWriter()           # background writer of the debug artifacts
+
+    @property
+    def zed(self):
+        """ZED camera instance currently open, or None."""
+        return self.session.zed
 
     def start_cam(self, system_pose: Pose, gui: MultiTerminalGUI):
         """
@@ -24,6 +178,7 @@ class CameraHandler:
         If the camera is not initialized, it calls `zed_manager.zed_init(system_pose)` and logs
         a success message. If initialization fails, it logs an error message and re-raises
         the exception. If the camera is already initialized, it logs that information.
+        The camera then stays open until the session idle timeout or close_cam().
 
         Args:
             system_pose (Pose): The actual pose of the camera in the system used to configure the ZED camera.
@@ -37,20 +192,15 @@ class CameraHandler:
             ZED camera initialized.
         """
         
-        if self.zed is None:
-            try:
-                self.zed = zed_manager.zed_init(system_pose)
-                gui.write_to_terminal(2, "ZED camera initialized.")
-            except Exception as e:
-                gui.write_to_terminal(4, f"Failed to initialize ZED camera: {e}")
-                raise e
-        else:
+        if self.session.is_open:
             gui.write_to_terminal(2, "ZED camera is already initialized.")
+            return
+        self.session.open(system_pose, gui)
 
     def scan_and_find_plants(self, system_pose: Pose, plants_number: int, gui: MultiTerminalGUI,
-                             bbox_type: str = "p") -> List[List[float]]:
+                             bbox_type: str = "p", tcp_pose=None) -> np.ndarray:
         """
-        Scans the environment, segments plants, and returns their 3D bounding boxes.
+        Scans the environment, segments plants, and returns their 3D bounding boxes in the robot base frame.
 
         Args:
             system_pose (Pose): The current pose of the system for camera reference.
@@ -58,13 +208,12 @@ class CameraHandler:
             gui (MultiTerminalGUI): GUI interface for displaying status and error messages.
             bbox_type (str, optional): Format of the bounding box. 
                 Must be 'c' (COCO), 'y' (YOLO), or 'p' (PascalVOC). Defaults to 'p'.
+            tcp_pose (optional): actual TCP pose at capture time, as Dobot coordinates [x, y, z, rx, ry, rz],
+                feedback record/FeedbackSnapshot or 4x4 matrix. Defaults to `system_pose`.
 
         Returns:
-            List[List[float]]: A list of 3D bounding boxes (in millimeters) for the detected plants, in the format 
-            {
-                "min": {"x": x_min, "y": y_min, "z": z_min},
-                "max": {"x": x_max, "y": y_max, "z": z_max}
-            }.
+            np.ndarray: (N, 6) array with the 3D bounding boxes (in millimeters) of the detected plants,
+            one row per plant in the requested format (see bbox3d).
 
         Raises:
             ValueError: If `bbox_type` is not one of 'c', 'y', or 'p'.
@@ -73,8 +222,8 @@ class CameraHandler:
         Example:
             >>> bbox_list = robot.scan_and_find_plants(current_pose, 2, gui, bbox_type='p')
             >>> print(bbox_list)
-            [[120.0, 250.0, 100.0, 180.0, 300.0, 200.0], 
-            [300.0, 400.0, 150.0, 350.0, 450.0, 200.0]]
+            [[120. 250. 100. 180. 300. 200.]
+             [300. 400. 150. 350. 450. 200.]]
         """
         
         if bbox_type not in ["c", "y", "p"]:
@@ -82,49 +231,47 @@ class CameraHandler:
             raise ValueError(f"Invalid bbox_type '{bbox_type}'.")
 
         try:
-            # Initialize the ZED camera
-            if self.zed is None:
-                self.start_cam(system_pose, gui)
-
-            # Capture the environment with the ZED camera
-            image, depth_map, normal_map, point_cloud = self.get_image_cam(system_pose, gui, save=True)
-
-            # Filter the plants from the background
-            mask = find_plant.filter_plants(image, save_mask=True)
-            
-            # Divide the plants into clusters
-            masks, bounding_boxes = find_plant.segment_plants(mask, plants_number)
-            
-            # Save clustered image for visualization
-            find_plant.save_clustered_image(image, bounding_boxes)
-
-            # Extract the 3D points from the clusters
-            bbox_list: List[List[float]] = []
-            for m in masks:
-                bbxpts = find_plant.get_3d_bbox(m, point_cloud)
-                if bbxpts is None:
-                    continue
-
-                # Convert to desired bbox format
-                if bbox_type == "c":
-                    bbox_temp = self.get_bbox_COCO(bbxpts)
-                    if bbox_temp is None:
-                        continue
-                    bbox_list.append([val * 1000 for val in bbox_temp])  # Convert to mm
-
-                elif bbox_type == "p":
-                    bbox_temp = self.get_bbox_PascalVOC(bbxpts)
-                    if bbox_temp is None:
-                        continue
-                    bbox_list.append([val * 1000 for val in bbox_temp])
-
-                elif bbox_type == "y":
-                    bbox_temp = self.get_bbox_YOLO(bbxpts)
-                    if bbox_temp is None:
-                        continue
-                    bbox_list.append([val * 1000 for val in bbox_temp])
-
-            gui.write_to_terminal(2, f"Piante trovate: {bbox_list}")
+            # Capture the environment with the ZED camera (opened on first use, kept open afterwards)
+            if self.save_debug:
+                self.artifacts.new_scan(gui=gui)
+            image, depth_map, normal_map, point_cloud = self.get_image_cam(system_pose, gui, save=self.save_debug)
+
+            if self.detection_scale > 1:
+                # Segment at reduced resolution, refine the masks at full resolution inside each plant ROI
+                detection = plant_detection.detect_plants(image, plants_number, self.detection_scale)
+                labels, n_plants = detection.labels, len(detection.rois)
+                if self.save_debug:
+                    plant_detection.save_debug_images(image, detection, self.artifacts)
+            else:
+                # Filter the plants from the background
+                mask = find_plant.filter_plants(image, save_mask=False)
+
+                # Divide the plants into clusters
+                masks, bounding_boxes = find_plant.segment_plants(mask, plants_number)
+
+                # Save mask and clustered image for visualization, in background
+                if self.save_debug:
+                    self.artifacts.submit("filter", np.asarray(mask) > 0)
+                    self.artifacts.submit_call(find_plant.save_clustered_image, np.array(image, copy=True),
+                                               copy.deepcopy(bounding_boxes))
+                n_plants = len(masks)
+                labels = bbox3d.labels_from_masks(masks) if n_plants else None
+
+            # Extract the 3D boxes of all the clusters in one pass over the point cloud
+            if n_plants == 0:
+                gui.write_to_terminal(2, "Nessuna pianta trovata.")
+                return np.empty((0, 6))
+            boxes = bbox3d.extract_bboxes(labels, point_cloud, n_plants, trim_percentile=self.trim_percentile)
+
+            # Convert to millimetres, move to the robot base frame and convert to the desired bbox format
+            boxes = bbox3d.scale(boxes[bbox3d.is_valid(boxes)], bbox3d.M_TO_MM)
+            if not self.extrinsics.calibrated:
+                gui.write_to_terminal(4, "Calibrazione hand-eye assente (files/hand_eye.npy): bbox calcolate "
+                                         "con la camera coincidente al TCP, non usarle per muovere il robot.")
+            boxes = self.extrinsics.boxes_to_base(boxes, system_pose if tcp_pose is None else tcp_pose)
+            bbox_list = bbox3d.to_format(boxes, bbox_type)
+
+            gui.write_to_terminal(2, f"Piante trovate: {np.round(bbox_list, 1).tolist()}")
             
             return bbox_list
         except Exception as e:
@@ -135,12 +282,14 @@ class CameraHandler:
         """
         Captures an image, depth map, normal map, and point cloud from the ZED camera.
 
-        If the camera is not already initialized, it will start it. After capturing, the camera is closed automatically.
+        If the camera is not already initialized, it will start it. The camera stays open after the capture,
+        so following captures and recordings do not pay the initialization again.
 
         Args:
             system_pose (Pose): The current pose of the system for camera reference.
             gui (MultiTerminalGUI): GUI interface for displaying status and error messages.
-            save (bool, optional): Whether to save the captured images and maps to disk. Defaults to False.
+            save (bool, optional): Whether to save the captured image and depth map to disk, in background
+                through `self.artifacts` (current scan folder). Defaults to False.
 
         Returns:
             Tuple: A tuple containing:
@@ -158,25 +307,28 @@ class CameraHandler:
             (720, 1280, 3) (720, 1280)
         """
         
-        if self.zed is None:
-            self.start_cam(system_pose, gui)
-
-        try:
-            image, depth_map, normal_map, point_cloud = zed_manager.get_zed_image(self.zed, save=save)
-            gui.write_to_terminal(2, "Image captured and saved from ZED camera.")
-            self.close_cam(gui)     # Close camera after capturing
-            return image, depth_map, normal_map, point_cloud
-        except Exception as e:
-            gui.write_to_terminal(4, f"Failed to get image from ZED camera: {e}")
-            self.close_cam(gui)
-            raise e
+        with self.session.grab_lease(system_pose, gui) as zed:
+            try:
+                image, depth_map, normal_map, point_cloud = zed_manager.get_zed_image(zed, save=False)
+                if save:
+                    # Encoded and written by the artifact writer, the capture does not wait for the disk
+                    self.artifacts.gui = gui
+                    self.artifacts.submit("saved_image", np.array(image, copy=True))
+                    self.artifacts.submit("saved_depth_map", np.array(depth_map, copy=True), codec="npy")
+                gui.write_to_terminal(2, "Image captured from ZED camera.")
+                return image, depth_map, normal_map, point_cloud
+            except Exception as e:
+                gui.write_to_terminal(4, f"Failed to get image from ZED camera: {e}")
+                raise e
 
     def record_cam(self, system_pose: Pose, gui: MultiTerminalGUI, plant_name: str = "piantina1", frames: int = 300):
         """
         Records a point cloud sequence from the camera and saves it to disk.
 
         This function uses `create_plc.record_and_save` to capture a specified number of frames
-        of a plant and save the resulting point cloud. Status messages are displayed in the GUI.
+        of a plant and save the resulting point cloud, which is then rewritten as binary PLY
+        (see ply_io) unless `binary_ply` is False and fused on a voxel grid into <plant_name>_fused.ply
+        unless `voxel_size` is None. Status messages are displayed in the GUI.
 
         Args:
             system_pose (Pose): The current pose of the system (used for reference, if needed).
@@ -193,17 +345,48 @@ class CameraHandler:
         """
         try:
             gui.write_to_terminal(2, f"Record point cloud for {plant_name} started.")
-            create_plc.record_and_save(plant_name=plant_name, frames=frames, mesh=False)
+            # create_plc opens the camera itself: the session hands the device over for the recording
+            with self.session.record_lease(gui):
+                create_plc.record_and_save(plant_name=plant_name, frames=frames, mesh=False)
             gui.write_to_terminal(2, f"Point cloud for {plant_name} recorded and saved.")
+            if self.binary_ply:
+                self._convert_point_cloud(plant_name, gui)
+            if self.voxel_size:
+                self._fuse_point_cloud(plant_name, gui)
         except Exception as e:
             gui.write_to_terminal(4, f"Failed to record point cloud: {e}")
             raise e
 
+    @staticmethod
+    def _convert_point_cloud(plant_name: str, gui: MultiTerminalGUI):
+        """Rewrite the ASCII .ply saved by create_plc as binary little-endian, so it can be memory-mapped."""
+        path = os.path.join(POINT_CLOUD_DIR, f"{plant_name}.ply")
+        if not os.path.exists(path):
+            return
+        try:
+            ply_io.ascii_to_binary(path)
+            gui.write_to_terminal(2, f"Point cloud {path} converted to binary PLY.")
+        except Exception as e:
+            gui.write_to_terminal(4, f"Failed to convert point cloud {path}: {e}")
+
+    def _fuse_point_cloud(self, plant_name: str, gui: MultiTerminalGUI):
+        """Downsample the recorded cloud on a voxel grid of `voxel_size` into <plant_name>_fused.ply."""
+        path = os.path.join(POINT_CLOUD_DIR, f"{plant_name}.ply")
+        if not os.path.exists(path):
+            return
+        out_path = os.path.join(POINT_CLOUD_DIR, f"{plant_name}_fused.ply")
+        try:
+            grid = voxel_fusion.downsample_ply(path, out_path, self.voxel_size)
+            gui.write_to_terminal(2, f"Fused point cloud {out_path} (voxel {grid.voxel_size * 1000:.1f} mm): "
+                                     f"{grid.points} -> {len(grid)} points.")
+        except Exception as e:
+            gui.write_to_terminal(4, f"Failed to fuse point cloud {path}: {e}")
+
     def close_cam(self, gui: MultiTerminalGUI):
         """
         Closes the ZED camera if it is currently initialized.
 
-        This function safely shuts down the ZED camera and updates the `self.zed` attribute to None.
+        This function safely shuts down the ZED camera session (waiting for running captures) so `self.zed` becomes None.
         Status messages are displayed in the GUI. If the camera is not initialized, a message is shown.
 
         Args:
@@ -215,13 +398,8 @@ class CameraHandler:
         Example:
             >>> robot.close_cam(gui)
         """
-        if self.zed is not None:
-            try:
-                self.zed.close()
-            except Exception as e:
-                gui.write_to_terminal(4, f"Failed to close ZED camera: {e}")
-            self.zed = None
-            gui.write_to_terminal(2, "ZED camera closed.")
+        if self.session.is_open:
+            self.session.close(gui)
         else:
             gui.write_to_terminal(2, "ZED camera is not initialized.")
 
@@ -230,45 +408,38 @@ class CameraHandler:
         """
         Given a bounding box JSON with 'min' and 'max' points, compute the COCO format bbox as float values, such as:
             [x_min, y_min, z_min, width, depth, height].
+        For many boxes at once use bbox3d.to_coco on an (N, 2, 3) array.
         """
         if bbox is None:
             return None
-        min_pt = {k: float(v) for k, v in bbox["min"].items()}
-        max_pt = {k: float(v) for k, v in bbox["max"].items()}
-        width = max_pt["x"] - min_pt["x"]
-        depth = max_pt["y"] - min_pt["y"]
-        height = max_pt["z"] - min_pt["z"]
-        return [min_pt["x"], min_pt["y"], min_pt["z"], width, depth, height]
+        return bbox3d.to_coco(CameraHandler._bbox_array(bbox))[0].tolist()
 
     @staticmethod
     def get_bbox_YOLO(bbox: Optional[Dict[str, Dict[str, float]]]):
         """
         Given a bounding box JSON with 'min' and 'max' points, compute the YOLO format bbox in absolute value as float values, such as:
             [center_x, center_y, center_z, width, depth, height].
+        For many boxes at once use bbox3d.to_yolo on an (N, 2, 3) array.
         """
         if bbox is None:
             return None
-        min_pt = {k: float(v) for k, v in bbox["min"].items()}
-        max_pt = {k: float(v) for k, v in bbox["max"].items()}
-        center_x = (min_pt["x"] + max_pt["x"]) / 2.0
-        center_y = (min_pt["y"] + max_pt["y"]) / 2.0
-        center_z = (min_pt["z"] + max_pt["z"]) / 2.0
-        width = max_pt["x"] - min_pt["x"]
-        depth = max_pt["y"] - min_pt["y"]
-        height = max_pt["z"] - min_pt["z"]
-        return [center_x, center_y, center_z, width, depth, height]
+        return bbox3d.to_yolo(CameraHandler._bbox_array(bbox))[0].tolist()
 
     @staticmethod
     def get_bbox_PascalVOC(bbox: Optional[Dict[str, Dict[str, float]]]):
         """
         Given a bounding box JSON with 'min' and 'max' points, compute the Pascal VOC format bbox as int values, such as:
             [x_min, y_min, z_min, x_max, y_max, z_max]
+        For many boxes at once use bbox3d.to_pascal_voc on an (N, 2, 3) array (float values).
         """
         if bbox is None:
             return None
-        min_pt = {k: int(float(v)) for k, v in bbox["min"].items()}
-        max_pt = {k: int(float(v)) for k, v in bbox["max"].items()}
-        return [min_pt["x"], min_pt["y"], min_pt["z"], max_pt["x"], max_pt["y"], max_pt["z"]]
+        return bbox3d.to_pascal_voc(CameraHandler._bbox_array(bbox))[0].astype(int).tolist()
+
+    @staticmethod
+    def _bbox_array(bbox: Dict[str, Dict[str, float]]) -> np.ndarray:
+        """Convert a 'min'/'max' bbox JSON (values as strings or numbers) to a (2, 3) float array."""
+        return np.array([[float(bbox[corner][k]) for k in ("x", "y", "z")] for corner in ("min", "max")])
 
     @staticmethod
     def get_dobot_front_face_center_and_size(bbox: Dict):
@@ -278,7 +449,7 @@ class CameraHandler:
         Given a bounding box dictionary with 'min' and 'max' points, this function computes:
             - `min_pt` and `max_pt` as dictionaries with float values.
             - `dobot_coords` as (center_x, center_y, center_z, rx, ry, rz), suitable for the Dobot.
-            Note: The center coordinates are currently fixed offsets for example purposes.
+            The viewpoint is centred on the box in x, FRONT_VIEW_DISTANCE in front of it and at FRONT_VIEW_HEIGHT.
             - `bbox_size` as (size_x, size_y, size_z) representing the dimensions of the box.
 
         Args:
@@ -307,10 +478,11 @@ class CameraHandler:
         z_vals = [min_pt["z"], max_pt["z"]]
         vertici = [(x, y, z) for x in x_vals for y in y_vals for z in z_vals]
 
-        # Compute center of the front face of the box (example logic)
-        center_x = -143.0
-        center_y = ((vertici[1][1] + vertici[4][1]) / 2.0) - 700
-        center_z = 700.0
+        # Viewpoint in front of the box: the box must already be in the robot base frame (mm),
+        # see CameraExtrinsics.boxes_to_base
+        center_x = (min_pt["x"] + max_pt["x"]) / 2.0
+        center_y = ((vertici[1][1] + vertici[4][1]) / 2.0) - FRONT_VIEW_DISTANCE
+        center_z = FRONT_VIEW_HEIGHT
 
         # Default orientation (rx, ry, rz)
         rx = 90.0
@@ -351,7 +523,7 @@ class CameraHandler:
         ]
         return points
 
-    def usa_cam(self, system_pose: Pose, plants_number: int):
+    def usa_cam(self, system_pose: Pose, plants_number: int, gui: MultiTerminalGUI):
         """
         Metodo di test per utilizzare la telecamera ZED e processare l'ambiente circostante.
         Questo metodo inizializza la telecamera ZED, cattura immagini e mappe di profondità,
@@ -360,28 +532,23 @@ class CameraHandler:
         Args:
             pose (Pose): La posizione iniziale della telecamera ZED.
             plants_number (int): Il numero di piante da segmentare nell'immagine.
+            gui (MultiTerminalGUI): Interfaccia su cui stampare i messaggi.
         """
         # init camera
-        self.zed = zed_manager.zed_init(system_pose)
-        image, depth_map, normal_map, point_cloud = zed_manager.get_zed_image(self.zed, save=True)
+        with self.session.grab_lease(system_pose, gui) as zed:
+            image, depth_map, normal_map, point_cloud = zed_manager.get_zed_image(zed, save=True)
 
         mask = find_plant.filter_plants(image, save_mask=True)
         masks, bounding_boxes = find_plant.segment_plants(mask, plants_number)
         find_plant.save_clustered_image(image, bounding_boxes)
 
-        for m in masks:
-            _ = find_plant.get_3d_bbox(m, point_cloud)
+        _ = bbox3d.extract_bboxes(bbox3d.labels_from_masks(masks), point_cloud, len(masks))
 
-        try:
-            self.zed.close()
-        except Exception:
-            pass
-        self.zed = None
-        create_plc.record_and_save(plant_name='piantina1', frames=300)
+        self.record_cam(system_pose, gui, plant_name='piantina1', frames=300)
 
 
 if __name__ == "__main__":
     gui = MultiTerminalGUI()
     camera_handler = CameraHandler()
     test_pose = Pose()
-    camera_handler.usa_cam(test_pose, plants_number=2)
\ No newline at end of file
+    camera_handler.usa_cam(test_pose, plants_number=2, gui=gui)
\ No newline at end of file
@@ -0,0 +1,152 @@
+# capture_pipeline.py
+
+import os
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+import numpy as np
+
+from camera_handler_class import CameraHandler
+from multi_terminal_gui_class import MultiTerminalGUI
+from pose_class import Pose
+from telemetry_buffer import TelemetryRingBuffer
+
+FRAME_POSES_DIR = "crop_sensing/data"
+MOTION_WAIT_TIMEOUT = 300.0     # s, longest wait of the worker for the end of the scan motion
+
+# Feedback samples of the scan motion saved next to the point cloud (not per-frame tags:
+# create_plc.record_and_save does not expose the frame timestamps)
+MotionPoseType = np.dtype([
+    ('sample_time', np.float64),        # time.monotonic() of the feedback sample
+    ('tool_vector_actual', np.float64, (6,)),
+])
+
+
+class CaptureSession:
+    """
+    A recording running in the capture worker. The scan routine marks the scan motion with
+    motion_started()/motion_finished() and can wait on the session (join) before moving on to the
+    next plant, or cancel() it if the motion was not executed; `future` resolves to the feedback samples of the motion window when both the
+    recording and the motion are over.
+
+    recording_started_at/recording_finished_at delimit the create_plc call, camera initialisation
+    included, so they are not frame times.
+    """
+
+    def __init__(self, plant_name: str, frames: int):
+        self.plant_name = plant_name
+        self.frames = frames
+        self.recording_started_at: Optional[float] = None
+        self.recording_finished_at: Optional[float] = None
+        self.motion_started_at: Optional[float] = None
+        self.motion_finished_at: Optional[float] = None
+        self.cancelled = False
+        self._motion_done = threading.Event()
+        self.future: Future = Future()
+
+    def motion_started(self):
+        """Mark the start of the scan motion (call right before sending the trajectory)."""
+        self.motion_started_at = time.monotonic()
+
+    def motion_finished(self):
+        """Mark the end of the scan motion; also call it if the motion is aborted."""
+        self.motion_finished_at = time.monotonic()
+        self._motion_done.set()
+
+    def cancel(self):
+        """
+        Discard the session when the scan motion was not executed: a queued recording does not start,
+        a running one is not waited for by the worker and its poses are not saved.
+        """
+        self.cancelled = True
+        self.future.cancel()
+        self._motion_done.set()
+
+    def wait_motion(self, timeout: Optional[float] = None) -> bool:
+        return self._motion_done.wait(timeout)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the recording is over; returns False on timeout. Errors are re-raised."""
+        try:
+            self.future.result(timeout)
+        except FutureTimeoutError:
+            return False
+        return True
+
+
+class CapturePipeline:
+    """
+    Runs camera recordings in a dedicated worker thread and keeps the TCP poses
+    (`tool_vector_actual`) of the feedback samples received during the scan motion, saved as
+    <plant_name>_motion_poses.npy.
+
+    Frames are not tagged with poses: create_plc.record_and_save gives no frame timestamps, and
+    spreading the frames over the call window would include the camera initialisation. For the
+    same reason the recording cannot be stopped when the motion ends: it records a fixed number
+    of frames.
+    """
+
+    def __init__(self, camera: CameraHandler, output_dir: str = FRAME_POSES_DIR):
+        self.camera = camera
+        self.output_dir = output_dir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="CaptureWorker")
+        self._lock = threading.Lock()
+        self.current: Optional[CaptureSession] = None
+
+    def start(self, pose: Pose, gui: MultiTerminalGUI, plant_name: str, frames: int,
+              telemetry: Optional[TelemetryRingBuffer] = None) -> CaptureSession:
+        """
+        Queue a recording of `frames` frames and return immediately with its CaptureSession.
+        Recordings are serialised: a new one starts only after the previous one has finished.
+        """
+        session = CaptureSession(plant_name, frames)
+        with self._lock:
+            self.current = session
+        self._executor.submit(self._record, session, pose, gui, telemetry)
+        return session
+
+    def _record(self, session: CaptureSession, pose: Pose, gui: MultiTerminalGUI,
+                telemetry: Optional[TelemetryRingBuffer]):
+        if not session.future.set_running_or_notify_cancel():
+            return
+        try:
+            session.recording_started_at = time.monotonic()
+            self.camera.record_cam(pose, gui, session.plant_name, session.frames)
+            session.recording_finished_at = time.monotonic()
+            if session.cancelled:
+                raise RuntimeError(f"scansione di {session.plant_name} annullata, registrazione senza movimento scartata")
+            if not session.wait_motion(MOTION_WAIT_TIMEOUT):
+                gui.write_to_terminal(4, f"Fine del movimento di {session.plant_name} non segnalata, pose non salvate.")
+            track = self._motion_track(session, telemetry)
+            if track is not None:
+                path = os.path.join(self.output_dir, f"{session.plant_name}_motion_poses.npy")
+                np.save(path, track)
+                gui.write_to_terminal(2, f"Pose del movimento di scansione di {session.plant_name} salvate in {path}.")
+            session.future.set_result(track)
+        except Exception as e:
+            gui.write_to_terminal(4, f"Errore durante la registrazione: {e}")
+            session.future.set_exception(e)
+
+    @staticmethod
+    def _motion_track(session: CaptureSession, telemetry: Optional[TelemetryRingBuffer]) -> Optional[np.ndarray]:
+        """Feedback samples received between motion_started() and motion_finished()."""
+        if telemetry is None or session.motion_started_at is None or session.motion_finished_at is None:
+            return None
+        # Only the motion window is copied out of the history
+        window = time.monotonic() - session.motion_started_at
+        sample_times, packets = telemetry.history_with_times(window)
+        inside = (sample_times >= session.motion_started_at) & (sample_times <= session.motion_finished_at)
+        if not inside.any():
+            return None
+        track = np.zeros(int(inside.sum()), dtype=MotionPoseType)
+        track['sample_time'] = sample_times[inside]
+        track['tool_vector_actual'] = packets['tool_vector_actual'][inside]
+        return track
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -6,10 +6,21 @@ import numpy as np
 import os
 import json
 import time
+from contextlib import contextmanager
 
 alarmControllerFile = "files/alarm_controller.json"
 alarmServoFile = "files/alarm_servo.json"
 
+# Terminatori delle risposte del controller (es. "0,{},EnableRobot();")
+REPLY_TERMINATORS = (b";", b"\n")
+RECV_CHUNK_SIZE = 4096
+
+# Parametri del flusso di feedback (porta 30005)
+FEEDBACK_BUFFER_PACKETS = 64        # capienza del buffer di ricezione, in pacchetti
+FEEDBACK_TIMEOUT = 1                # secondi di attesa per una recv
+FEEDBACK_MAX_TIMEOUTS = 5           # timeout consecutivi prima di riaprire la connessione
+FEEDBACK_TEST_VALUE = 0x123456789abcdef
+
 # Port Feedback
 MyType = np.dtype([(
     'len',
@@ -118,6 +129,11 @@ MyType = np.dtype([(
     ('actual_quaternion', np.float64, (4,)),
     ('reserve3', np.byte, (24,))])
 
+FEEDBACK_PACKET_SIZE = MyType.itemsize  # 1440 byte
+FEEDBACK_TEST_VALUE_OFFSET = MyType.fields['test_value'][1]
+FEEDBACK_LEN_BYTES = FEEDBACK_PACKET_SIZE.to_bytes(8, 'little', signed=True)
+FEEDBACK_TEST_VALUE_BYTES = FEEDBACK_TEST_VALUE.to_bytes(8, 'little')
+
 
 # Leggere i file di allarme del controller e del servo
 
@@ -134,6 +150,13 @@ def alarmAlarmJsonFile():
     return dataController, dataServo
 
 
+class CommandBatch:
+    """Comandi accodati da DobotApi.pipeline() e relative risposte, nello stesso ordine."""
+    def __init__(self):
+        self.commands = []
+        self.replies = []
+
+
 class DobotApi:
     def __init__(self, ip, port, gui, *args):
         """
@@ -144,6 +167,9 @@ class DobotApi:
         self.gui = gui
         self.socket_dobot = 0
         self.__globalLock = threading.Lock()
+        self.__recvBuffer = bytearray()     # buffer di riassemblaggio delle risposte
+        self.reply_failed = False           # True se l'ultima wait_reply è fallita (connessione riaperta)
+        self.__pipeline = threading.local()  # batch di comandi in pipeline per thread
         self.text_log: Text = None
         if args:
             self.text_log = args[0]
@@ -185,21 +211,54 @@ class DobotApi:
         """
         self.log_command(f" -- send to {self.port} - {string}")
         try:
-            self.socket_dobot.send(str.encode(string, 'utf-8'))
+            self.socket_dobot.sendall(str.encode(string, 'utf-8'))
         except Exception as e:
             self.log_error(e)
 
+    def _pop_frame(self):
+        """
+    estrae dal buffer di riassemblaggio la prima risposta completa (terminata da ';' o da newline).
+	Parametri: riferimento
+	Returns: la risposta senza terminatore, oppure None se nel buffer non c'è ancora una risposta completa
+    """
+        buf = self.__recvBuffer
+        # Scarta terminatori e spazi rimasti dalla risposta precedente (es. ";\n")
+        start = 0
+        while start < len(buf) and buf[start] in b";\r\n ":
+            start += 1
+        if start:
+            del buf[:start]
+        ends = [i for i in (buf.find(t) for t in REPLY_TERMINATORS) if i >= 0]
+        if not ends:
+            return None
+        end = min(ends) + 1
+        frame = bytes(buf[:end]).rstrip(b"\r\n")
+        del buf[:end]
+        return frame
+
     def wait_reply(self):
         """
-    richiede via socket una risposta al dobot, la restituisce e la invia ai log.
+    legge dalla socket finchè nel buffer di riassemblaggio non c'è una risposta completa, la restituisce e la invia ai log.
+	Le risposte troncate vengono completate con le recv successive, quelle concatenate restano nel buffer per la chiamata successiva.
 	Parametri: riferimento
 	Returns: la risposta ricevuta
     """
-        data = ""
+        data = b""
+        self.reply_failed = False
         try:
-            data = self.socket_dobot.recv(1024)
+            frame = self._pop_frame()
+            while frame is None:
+                chunk = self.socket_dobot.recv(RECV_CHUNK_SIZE)
+                if not chunk:   # connessione chiusa dal controller
+                    raise ConnectionError(f"connessione chiusa dal controller sulla porta {self.port}")
+                self.__recvBuffer += chunk
+                frame = self._pop_frame()
+            data = frame
         except Exception as e:
-            self.log_error(e)
+            # Il frame parziale (o una risposta in ritardo) verrebbe letto come risposta del comando successivo
+            self.log_error(f"Risposta non ricevuta dalla porta {self.port}: {e}")
+            self.reply_failed = True
+            self._reset_connection()
         finally:
             if len(data) == 0:
                 data_str = "no data recived"
@@ -208,17 +267,84 @@ class DobotApi:
             self.log_command(f' -- receive from {self.port} - {data_str}')
             return data_str
 
+    def _reset_connection(self):
+        """
+    svuota il buffer di riassemblaggio e riapre la socket, così le risposte successive restano allineate ai comandi.
+	Parametri: riferimento
+    """
+        self.__recvBuffer.clear()
+        timeout = self.socket_dobot.gettimeout()
+        try:
+            self.socket_dobot.close()
+        except OSError:
+            pass
+        try:
+            self.socket_dobot = socket.socket()
+            self.socket_dobot.settimeout(timeout)
+            self.socket_dobot.connect((self.ip, self.port))
+            self.log_error(f"Connessione alla porta {self.port} riaperta")
+        except OSError as e:
+            self.log_error(f"Riconnessione alla porta {self.port} fallita: {e}")
+
     def sendRecvMsg(self, string):
         """
     wrappa e unisce le funzioni send_data e wait_reply rendendole sincronizzate, ovvero richiede un lock del thread verso il dobot (ovvero solo lui può eseguire queste chiamate finchè è lockato), esegue un send data con il testo preso come parametro e aspetta lòa risposta, poi la ritorna.
+	Se il thread corrente è dentro un blocco pipeline() il comando viene solo accodato e la funzione ritorna None.
 	Parametri: riferimento e istruzioni da passare al robot
 	Returns: risposta del robot
     """
+        batch = getattr(self.__pipeline, "batch", None)
+        if batch is not None:
+            batch.commands.append(string)
+            return None
         with self.__globalLock:
             self.send_data(string)
             recvData = self.wait_reply()
             return recvData
 
+    def sendRecvBatch(self, strings):
+        """
+    invia più comandi uno dopo l'altro senza attendere le singole risposte, poi legge le risposte e le associa ai comandi nell'ordine di invio.
+	Il costo è circa un round trip per l'intero batch invece di uno per comando.
+	Parametri: riferimento e lista dei comandi da passare al robot
+	Returns: lista delle risposte del robot, nello stesso ordine dei comandi
+    """
+        strings = list(strings)
+        if not strings:
+            return []
+        with self.__globalLock:
+            self.send_data("".join(strings))
+            replies = []
+            for _ in strings:
+                replies.append(self.wait_reply())
+                if self.reply_failed:   # connessione riaperta: le risposte restanti sono perse
+                    break
+            return replies + ["no data recived"] * (len(strings) - len(replies))
+
+    @contextmanager
+    def pipeline(self):
+        """
+    context manager che accoda i comandi inviati dal thread corrente e li spedisce in un unico batch all'uscita dal blocco.
+	Dentro il blocco i metodi (SpeedFactor, SpeedJ, User, Tool, ...) ritornano None, le risposte sono in batch.replies dopo il blocco.
+	Parametri: riferimento
+	Returns: l'oggetto CommandBatch con i comandi accodati e le risposte
+
+    Esempio:
+        with dashboard.pipeline() as batch:
+            dashboard.SpeedFactor(30)
+            dashboard.SpeedJ(40)
+        print(batch.replies)
+    """
+        if getattr(self.__pipeline, "batch", None) is not None:
+            raise RuntimeError("pipeline() già attiva su questo thread")
+        batch = CommandBatch()
+        self.__pipeline.batch = batch
+        try:
+            yield batch
+        finally:
+            self.__pipeline.batch = None
+        batch.replies = self.sendRecvBatch(batch.commands)
+
     def close(self):
         """
     chiude la connessione socket con il robot
@@ -1079,85 +1205,136 @@ class DobotApiMove(DobotApi):
 
 
 class DobotApiFeedBack(DobotApi):
+    """
+  Connessione al flusso di feedback (porta 30005): il controller invia un pacchetto MyType da 1440 byte ogni 8 ms.
+  I pacchetti vengono letti con recv_into in un buffer preallocato e decodificati direttamente dal buffer,
+  riallineandosi sul campo len e sul marker test_value se una lettura cade a metà pacchetto.
+  """
     def __init__(self, ip, port, gui, *args):
         super().__init__(ip, port, gui, *args)
         self.__MyType = []
         self.last_recv_time = time.perf_counter()
         self.gui = gui
 
+        self.__buffer = bytearray(FEEDBACK_PACKET_SIZE * FEEDBACK_BUFFER_PACKETS)
+        self.__view = memoryview(self.__buffer)
+        self.__start = 0        # primo byte non ancora consumato
+        self.__end = 0          # fine dei byte validi nel buffer
+        self.__timeouts = 0     # timeout consecutivi
+        self.bytes_discarded = 0
+        self.socket_dobot.settimeout(FEEDBACK_TIMEOUT)
+
     def log_feedback(self, message):
         date = datetime.datetime.now().strftime("%H:%M:%S ")
         self.gui.write_to_terminal(5, date + message + "\n")
     
     def log_error(self, message):
         date = datetime.datetime.now().strftime("%H:%M:%S ")
-        self.gui.write_to_terminal(4, date + message + "\n")
+        self.gui.write_to_terminal(4, date + str(message) + "\n")
 
-    def feedBackData(self):
-        """ Return the robot status every 200ms """
-        self.socket_dobot.setblocking(True)  # 设置为阻塞模式
-        self.socket_dobot.settimeout(1)  # impostato per l feedback da 200ms
-        data = bytes()
-        temp = bytes()
-       
+    def _reconnect(self):
+        """
+    chiude e riapre la socket di feedback e svuota il buffer dei pacchetti.
+	Parametri: riferimento
+    """
+        self.__start = self.__end = 0
+        self.__timeouts = 0
         try:
-            temp = self.socket_dobot.recv(144000) 
-        except socket.timeout:
-            self.log_feedback("Socket timeout at point 1 occurred while receiving data, sleeping")
-            try:
-                self.socket_dobot.close()
-                self.socket_dobot = socket.socket()
-                self.socket_dobot.connect((self.ip, self.port))
-                self.socket_dobot.setblocking(True)  # 设置为阻塞模式
-                self.socket_dobot.settimeout(1)  # 设置超时时间为0.1秒
-            except socket.error:
-                self.log_error(socket.error)
-                raise Exception(
-                    f"Unable to set socket connection while using port {self.port} !", socket.error)
-            # Close and reopen the socket
-        
-        if len(temp) > 1440:    
+            self.socket_dobot.close()
+            self.socket_dobot = socket.socket()
+            self.socket_dobot.connect((self.ip, self.port))
+            self.socket_dobot.settimeout(FEEDBACK_TIMEOUT)
+        except socket.error as e:
+            self.log_error(e)
+            raise Exception(
+                f"Unable to set socket connection while using port {self.port} !", e)
+
+    def _is_packet_start(self, pos):
+        """
+    controlla se all'offset pos del buffer inizia un pacchetto valido (len == 1440 e marker test_value).
+	Parametri: riferimento e offset nel buffer
+	Returns: True se il pacchetto è allineato
+    """
+        view = self.__view
+        return (view[pos:pos + 8] == FEEDBACK_LEN_BYTES and
+                view[pos + FEEDBACK_TEST_VALUE_OFFSET:pos + FEEDBACK_TEST_VALUE_OFFSET + 8] == FEEDBACK_TEST_VALUE_BYTES)
+
+    def _resync(self, pos):
+        """
+    cerca nel buffer il prossimo inizio di pacchetto valido dopo pos, scartando i byte intermedi.
+	Parametri: riferimento e offset del pacchetto non allineato
+	Returns: il nuovo offset da cui riprendere la decodifica
+    """
+        idx = self.__buffer.find(FEEDBACK_TEST_VALUE_BYTES, pos + 1 + FEEDBACK_TEST_VALUE_OFFSET, self.__end)
+        while idx != -1:
+            candidate = idx - FEEDBACK_TEST_VALUE_OFFSET
+            if self.__view[candidate:candidate + 8] == FEEDBACK_LEN_BYTES:
+                self.bytes_discarded += candidate - pos
+                return candidate
+            idx = self.__buffer.find(FEEDBACK_TEST_VALUE_BYTES, idx + 1, self.__end)
+        # Nessun marker completo: si tengono solo i byte che possono ancora contenere un inizio di pacchetto
+        new_pos = max(pos + 1, self.__end - FEEDBACK_TEST_VALUE_OFFSET - 7)
+        self.bytes_discarded += new_pos - pos
+        return new_pos
+
+    def feedBackPackets(self):
+        """
+    esegue una recv_into nel buffer preallocato e restituisce tutti i pacchetti completi e allineati ricevuti,
+	ognuno decodificato una sola volta e senza copie (vista numpy sul buffer).
+	La vista resta valida solo fino alla chiamata successiva: chi la vuole conservare deve copiarla.
+	Parametri: riferimento
+	Returns: array MyType di uno o più pacchetti, oppure None se non c'è ancora un pacchetto completo
+    """
+        # Sposta in testa l'eventuale pacchetto parziale rimasto dalla lettura precedente
+        if self.__start:
+            remaining = self.__end - self.__start
+            self.__view[:remaining] = self.__view[self.__start:self.__end]
+            self.__start, self.__end = 0, remaining
+
+        if self.__end < len(self.__buffer):
             try:
-                temp = self.socket_dobot.recv(144000)
+                received = self.socket_dobot.recv_into(self.__view[self.__end:])
             except socket.timeout:
-                self.log_feedback("Socket timeout for exceeded 1440 bytes occurred while receiving data, sleeping")
-                raise Exception("Socket timeout occurred while receiving data for exceeded 1440 bytes")
-        
-        i = 0
-        if len(temp) < 1440:
-            while i < 5:
-                try:
-                    temp = self.socket_dobot.recv(144000)
-                except socket.timeout:
-                    self.log_feedback("Socket timeout occurred while receiving data in third branch, try n: " + str(i))
-                    try:
-                        self.socket_dobot.close()
-                        self.socket_dobot = socket.socket()
-                        self.socket_dobot.connect((self.ip, self.port))
-                        self.socket_dobot.setblocking(True)  # 设置为阻塞模式
-                        self.socket_dobot.settimeout(1)  # 设置超时时间为0.1秒
-                    except socket.error:
-                        self.log_error(socket.error)
-                        raise Exception(
-                                f"Unable to set socket connection while using port {self.port} !", socket.error)
-                    continue  # Retry the recv operation
-                if len(temp) > 1440:
-                    break
-                i += 1
-            if i >= 5:
-                raise Exception("接收数据包缺失，请检查网络环境")
-        
-        #interval = (current_recv_time - self.last_recv_time) * 1000  # 转换为毫秒
-        #self.last_recv_time = current_recv_time
-        #print(f"Time interval since last receive: {interval:.3f} ms")
-        
-        data = temp[0:1440] #截取1440字节
-        #print(len(data))
-        #print(f"Single element size of MyType: {MyType.itemsize} bytes")
-        self.__MyType = None   
-
-        if len(data) == 1440:        
-            self.__MyType = np.frombuffer(data, dtype=MyType)
+                self.__timeouts += 1
+                self.log_feedback(f"Socket timeout while receiving feedback data, try n: {self.__timeouts}")
+                if self.__timeouts >= FEEDBACK_MAX_TIMEOUTS:
+                    self._reconnect()
+                return None
+            if received == 0:   # connessione chiusa dal controller
+                self.log_feedback("Feedback connection closed by the controller, reconnecting")
+                self._reconnect()
+                return None
+            self.__timeouts = 0
+            self.__end += received
+
+        pos = self.__start
+        count = 0
+        while self.__end - pos >= FEEDBACK_PACKET_SIZE:
+            if self._is_packet_start(pos):
+                pos += FEEDBACK_PACKET_SIZE
+                count += 1
+                continue
+            if count:
+                break   # restituisce i pacchetti allineati, il riallineamento avviene alla prossima chiamata
+            pos = self._resync(pos)
+            self.__start = pos
+
+        if count == 0:
+            self.__start = pos
+            return None
+
+        packets = np.frombuffer(self.__buffer, dtype=MyType, count=count, offset=self.__start)
+        self.__start += count * FEEDBACK_PACKET_SIZE
+        return packets
 
+    def feedBackData(self):
+        """
+    restituisce il pacchetto più recente tra quelli ricevuti dall'ultima chiamata.
+	Parametri: riferimento
+	Returns: array MyType di un elemento (vista sul buffer, valida fino alla chiamata successiva) oppure None
+    """
+        packets = self.feedBackPackets()
+        self.__MyType = None
+        if packets is not None:
+            self.__MyType = packets[-1:]
         return self.__MyType
-        
@@ -0,0 +1,216 @@
+# extrinsics.py
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+import bbox3d
+import kinematics
+from pose_class import Pose
+
+# Hand-eye calibration: pose of the camera frame in the TCP frame (4x4, mm), written by calibrate_hand_eye
+HAND_EYE_FILE = os.path.join(os.path.dirname(__file__), "files", "hand_eye.npy")
+
+
+def quaternion_to_matrix(quaternions) -> np.ndarray:
+    """Rotation matrices from unit quaternions [w, x, y, z]. Accepts (4,) or (N, 4), returns (N, 3, 3)."""
+    q = np.atleast_2d(np.asarray(quaternions, dtype=float))
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    R[:, 0, 1] = 2 * (x * y - z * w)
+    R[:, 0, 2] = 2 * (x * z + y * w)
+    R[:, 1, 0] = 2 * (x * y + z * w)
+    R[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    R[:, 1, 2] = 2 * (y * z - x * w)
+    R[:, 2, 0] = 2 * (x * z - y * w)
+    R[:, 2, 1] = 2 * (y * z + x * w)
+    R[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def homogeneous(rotations, translations) -> np.ndarray:
+    """Stack (N, 3, 3) rotations and (N, 3) translations into (N, 4, 4) matrices."""
+    rotations = np.asarray(rotations, dtype=float).reshape(-1, 3, 3)
+    translations = np.asarray(translations, dtype=float).reshape(-1, 3)
+    T = np.zeros((len(rotations), 4, 4))
+    T[:, :3, :3] = rotations
+    T[:, :3, 3] = translations
+    T[:, 3, 3] = 1.0
+    return T
+
+
+def invert(T) -> np.ndarray:
+    """Inverse of rigid transforms (4, 4) or (N, 4, 4), using the transpose of the rotation."""
+    T = np.asarray(T, dtype=float)
+    R = np.swapaxes(T[..., :3, :3], -1, -2)
+    out = np.zeros_like(T)
+    out[..., :3, :3] = R
+    out[..., :3, 3] = -(R @ T[..., :3, 3, None])[..., 0]
+    out[..., 3, 3] = 1.0
+    return out
+
+
+def pose_matrix(pose: Pose, scale: float = bbox3d.M_TO_MM) -> np.ndarray:
+    """
+    4x4 matrix of a Pose (position in metres, quaternion orientation), with the translation
+    converted by `scale` (default to millimetres, the unit of the Dobot).
+    """
+    q = [pose.orientation.w, pose.orientation.x, pose.orientation.y, pose.orientation.z]
+    t = np.array([pose.position.x, pose.position.y, pose.position.z]) * scale
+    return homogeneous(quaternion_to_matrix(q), t)[0]
+
+
+def feedback_matrix(feedback, use_quaternion: bool = False) -> np.ndarray:
+    """
+    4x4 matrix of the actual TCP pose from a feedback record (MyType) or FeedbackSnapshot.
+    By default it uses tool_vector_actual [x, y, z, rx, ry, rz]; with use_quaternion the
+    orientation comes from actual_quaternion [w, x, y, z] (records only).
+    """
+    record = getattr(feedback, "record", feedback)
+    tool_vector = np.asarray(record['tool_vector_actual'], dtype=float).reshape(6)
+    if use_quaternion:
+        q = np.asarray(record['actual_quaternion'], dtype=float).reshape(4)
+        return homogeneous(quaternion_to_matrix(q), tool_vector[:3])[0]
+    return kinematics.pose_to_matrix(tool_vector)[0]
+
+
+def transform_points(T, points) -> np.ndarray:
+    """Apply a 4x4 transform to points (..., 3) in one vectorised pass."""
+    T = np.asarray(T, dtype=float)
+    points = np.asarray(points, dtype=float)
+    return points @ T[:3, :3].T + T[:3, 3]
+
+
+def _rotation_log(R: np.ndarray) -> np.ndarray:
+    """Axis-angle vectors (N, 3) of rotations (N, 3, 3)."""
+    cos = np.clip((np.trace(R, axis1=1, axis2=2) - 1) / 2, -1.0, 1.0)
+    angle = np.arccos(cos)
+    axis = np.stack([R[:, 2, 1] - R[:, 1, 2], R[:, 0, 2] - R[:, 2, 0], R[:, 1, 0] - R[:, 0, 1]], axis=1)
+    sin = np.sin(angle)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factor = np.where(sin > 1e-9, angle / (2 * sin), 0.5)
+    return axis * factor[:, None]
+
+
+def calibrate_hand_eye(tcp_poses: Sequence, target_in_camera: Sequence) -> np.ndarray:
+    """
+    Eye-in-hand calibration (Park & Martin): estimate the camera pose in the TCP frame X from
+    N >= 3 views of a fixed target, solving A X = X B over the pairs of views.
+
+    Args:
+        tcp_poses: (N, 4, 4) TCP poses in the base frame, or (N, 6) Dobot poses [x, y, z, rx, ry, rz].
+        target_in_camera: (N, 4, 4) poses of the calibration target in the camera frame (mm).
+
+    Returns:
+        (4, 4) matrix X, camera frame expressed in the TCP frame.
+    """
+    G = np.asarray(tcp_poses, dtype=float)
+    if G.shape[-1] == 6:
+        G = kinematics.pose_to_matrix(G)
+    C = np.asarray(target_in_camera, dtype=float).reshape(-1, 4, 4)
+    if len(G) != len(C) or len(G) < 3:
+        raise ValueError("Servono almeno 3 viste, con una posa del target per ogni posa del robot")
+
+    i, j = np.triu_indices(len(G), k=1)
+    A = invert(G[j]) @ G[i]
+    B = C[j] @ invert(C[i])
+
+    # Rotation: the rotation axes satisfy alpha = R_X beta, solved with an SVD (Kabsch)
+    alpha = _rotation_log(A[:, :3, :3])
+    beta = _rotation_log(B[:, :3, :3])
+    U, _, Vt = np.linalg.svd(beta.T @ alpha)
+    D = np.diag([1.0, 1.0, np.sign(np.linalg.det(Vt.T @ U.T))])
+    R_X = Vt.T @ D @ U.T
+
+    # Translation: (R_A - I) t_X = R_X t_B - t_A, least squares over all pairs
+    lhs = (A[:, :3, :3] - np.eye(3)).reshape(-1, 3)
+    rhs = (B[:, :3, 3] @ R_X.T - A[:, :3, 3]).reshape(-1)
+    t_X = np.linalg.lstsq(lhs, rhs, rcond=None)[0]
+    return homogeneous(R_X, t_X)[0]
+
+
+def load_hand_eye(path: str = HAND_EYE_FILE) -> Optional[np.ndarray]:
+    """Saved hand-eye matrix, or None if the camera has not been calibrated yet."""
+    if os.path.exists(path):
+        return np.load(path).reshape(4, 4)
+    return None
+
+
+class CameraExtrinsics:
+    """
+    Camera-to-robot transforms: T_base_camera = T_base_tcp @ T_tcp_camera (hand-eye).
+    The matrices are cached per quantised TCP pose, since scans revisit the same viewpoints.
+
+    Without a hand-eye matrix (none given and no HAND_EYE_FILE) the identity is used, i.e. the
+    camera frame is taken as the TCP frame, and `calibrated` is False: callers must not drive
+    the robot to poses computed from these transforms.
+    """
+
+    def __init__(self, hand_eye: Optional[np.ndarray] = None, cache_size: int = 256, quantum: float = 0.01):
+        if hand_eye is None:
+            hand_eye = load_hand_eye()
+        self.calibrated = hand_eye is not None
+        self.hand_eye = np.eye(4) if hand_eye is None else np.asarray(hand_eye, dtype=float).reshape(4, 4)
+        self.cache_size = cache_size
+        self.quantum = quantum          # quantisation step of the cache key
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key_values: np.ndarray, build) -> np.ndarray:
+        key = tuple(np.round(key_values / self.quantum).astype(np.int64).tolist())
+        with self._lock:
+            T = self._cache.get(key)
+            if T is not None:
+                self._cache.move_to_end(key)
+                return T
+        T = build() @ self.hand_eye
+        T.flags.writeable = False
+        with self._lock:
+            self._cache[key] = T
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return T
+
+    def camera_to_base(self, tcp_pose) -> np.ndarray:
+        """
+        T_base_camera for a TCP pose given as Dobot coordinates [x, y, z, rx, ry, rz] (mm, deg),
+        as a Pose (metres, quaternion), as a 4x4 matrix (mm) or as a feedback record/FeedbackSnapshot.
+        """
+        record = getattr(tcp_pose, "record", tcp_pose)
+        if isinstance(record, (np.ndarray, np.void)) and record.dtype.names:
+            tcp_pose = np.asarray(record['tool_vector_actual'], dtype=float).reshape(6)
+        if isinstance(tcp_pose, Pose):
+            values = np.array([tcp_pose.position.x, tcp_pose.position.y, tcp_pose.position.z,
+                               tcp_pose.orientation.w, tcp_pose.orientation.x,
+                               tcp_pose.orientation.y, tcp_pose.orientation.z]) * [1000, 1000, 1000, 100, 100, 100, 100]
+            return self._cached(values, lambda: pose_matrix(tcp_pose))
+        tcp_pose = np.asarray(tcp_pose, dtype=float)
+        if tcp_pose.shape == (4, 4):
+            return tcp_pose @ self.hand_eye
+        return self._cached(tcp_pose.reshape(6), lambda: kinematics.pose_to_matrix(tcp_pose)[0])
+
+    def points_to_base(self, points, tcp_pose) -> np.ndarray:
+        """Transform camera points (..., 3) in mm to the robot base frame."""
+        return transform_points(self.camera_to_base(tcp_pose), points)
+
+    def boxes_to_base(self, boxes, tcp_pose) -> np.ndarray:
+        """Transform (N, 2, 3) camera boxes in mm to axis-aligned boxes in the robot base frame."""
+        return bbox3d.transform(boxes, self.camera_to_base(tcp_pose))
+
+    def set_hand_eye(self, hand_eye: np.ndarray, save_path: Optional[str] = None):
+        """Replace the hand-eye matrix (e.g. after calibrate_hand_eye), dropping the cached matrices."""
+        with self._lock:
+            self.hand_eye = np.asarray(hand_eye, dtype=float).reshape(4, 4)
+            self.calibrated = True
+            self._cache.clear()
+        if save_path is not None:
+            np.save(save_path, self.hand_eye)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
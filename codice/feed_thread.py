@@ -3,21 +3,153 @@
 import threading
 import time
 import re
+import json
+import queue
 import datetime
-from dobot_api import alarmAlarmJsonFile, DobotApiDashboard, DobotApiFeedBack
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+
+from alarm_catalogue import COLLISION_ID, SOURCE_CONTROLLER, SOURCE_SERVO, get_catalogue
+from dobot_api import DobotApiDashboard, DobotApiFeedBack
 from multi_terminal_gui_class import MultiTerminalGUI
+from telemetry_buffer import TelemetryRingBuffer
+from telemetry_log import TelemetryLog
 
 # Locks for thread synchronization
-feed_lock = threading.Lock()
 error_lock = threading.Lock()
 
-# Robot state variables (updated by GetFeed200ms thread)
-robotMode = 0
-algorithm_queue = 0
-enableStatus_robot = 0
-robotErrorState = False
-posizione_attuale = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
-angoli_attuali = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+class FeedbackSnapshot(NamedTuple):
+    """
+    Immutable view of the newest feedback packet received from port 30005.
+    Readers get a reference to the whole snapshot, so every field comes from the same packet.
+    """
+    seq: int                                # progressive number of the published packet
+    received_at: float                      # time.monotonic() at reception
+    robot_mode: int
+    enable_status: int
+    error_status: int
+    running_status: int
+    run_queued_cmd: int
+    q_actual: tuple                         # joint angles (deg)
+    tool_vector_actual: tuple               # TCP pose [x, y, z, rx, ry, rz]
+    record: np.ndarray                      # read-only MyType record with all the fields
+
+    @classmethod
+    def from_record(cls, record: np.ndarray, seq: int, received_at: float) -> "FeedbackSnapshot":
+        """Build a snapshot from a single MyType record, detaching it from the socket buffer."""
+        record = np.array(record, copy=True)   # 0-d structured array, independent of the packet buffer
+        record.flags.writeable = False
+        return cls(
+            seq=seq,
+            received_at=received_at,
+            robot_mode=int(record['robot_mode']),
+            enable_status=int(record['enable_status']),
+            error_status=int(record['error_status']),
+            running_status=int(record['running_status']),
+            run_queued_cmd=int(record['run_queued_cmd']),
+            q_actual=tuple(float(v) for v in record['q_actual']),
+            tool_vector_actual=tuple(float(v) for v in record['tool_vector_actual']),
+            record=record,
+        )
+
+    @property
+    def age(self) -> float:
+        """Seconds elapsed since the packet was received."""
+        return time.monotonic() - self.received_at
+
+
+class FeedbackReader:
+    """
+    Dedicated reader of the 30005 feedback stream.
+
+    The thread drains the socket continuously (the controller pushes a packet every 8 ms)
+    and keeps only the newest valid record, published as an immutable FeedbackSnapshot.
+    Publishing is a single reference assignment, so `latest` can be read from any thread
+    (RobotController, GUI, error thread) without taking locks.
+    If a TelemetryRingBuffer is given, every received packet is also appended to it;
+    if a TelemetryLog is given, every packet is also written to the binary telemetry log.
+    """
+
+    def __init__(self, feedFour: DobotApiFeedBack, gui: Optional[MultiTerminalGUI] = None,
+                 history: Optional[TelemetryRingBuffer] = None, telemetry_log: Optional[TelemetryLog] = None):
+        self.feedFour = feedFour
+        self.gui = gui
+        self.history = history
+        self.telemetry_log = telemetry_log
+        self._latest: Optional[FeedbackSnapshot] = None
+        self._seq = 0
+        self._updated = threading.Condition()   # notified at every published snapshot
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def latest(self) -> Optional[FeedbackSnapshot]:
+        """Newest snapshot, or None if no valid packet has been received yet."""
+        return self._latest
+
+    def wait_for(self, predicate: Callable[[FeedbackSnapshot], bool],
+                 timeout: Optional[float] = None) -> Optional[FeedbackSnapshot]:
+        """
+        Block until a published snapshot satisfies `predicate`, or until `timeout` seconds elapse.
+        The predicate is evaluated at every new packet, so waiters wake up within one feedback cycle.
+
+        Returns:
+            The snapshot that satisfied the predicate, or None on timeout.
+        """
+        with self._updated:
+            ok = self._updated.wait_for(
+                lambda: self._latest is not None and predicate(self._latest), timeout)
+            return self._latest if ok else None
+
+    def start(self):
+        """Start the reader thread if it is not already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FeedbackThread", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        """Stop the reader thread."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while self._running:
+            try:
+                packets = self.feedFour.feedBackPackets()
+            except Exception as e:
+                if self.gui is not None:
+                    self.gui.write_to_terminal(4, f"Feedback - Errore di lettura: {e}")
+                time.sleep(0.2)
+                continue
+
+            if packets is None:    # Timeout or no complete packet yet
+                continue
+
+            # Packets are already aligned on the test_value marker by DobotApiFeedBack
+            now = time.monotonic()
+            if self.history is not None:
+                self.history.append(packets, now)
+            if self.telemetry_log is not None:
+                try:
+                    self.telemetry_log.append(packets, now)
+                except Exception as e:     # e.g. disk full: stop logging, keep the feedback running
+                    self.telemetry_log = None
+                    if self.gui is not None:
+                        self.gui.write_to_terminal(4, f"Feedback - Log di telemetria disattivato: {e}")
+            self._publish(packets[-1], now)
+
+    def _publish(self, record: np.ndarray, received_at: float):
+        snapshot = FeedbackSnapshot.from_record(record, self._seq + 1, received_at)
+        with self._updated:
+            self._seq += 1
+            self._latest = snapshot
+            self._updated.notify_all()
+
 
 def converti_feed_in_string(values):
     """
@@ -29,92 +161,274 @@ def converti_feed_in_string(values):
     s += "]"
     return s
 
-def GetFeed200ms(feedFour: DobotApiFeedBack):
-    """
-    Thread function: continuously read feedback from the robot every 200ms.
-    Updates global state variables with the latest values.
-    """
-    global robotMode, algorithm_queue, enableStatus_robot, robotErrorState, posizione_attuale, angoli_attuali
-    while True:
-        with feed_lock:
-            feedInfo = feedFour.feedBackData()
-            
-            if feedInfo is None:    # In case of communication error, skip this iteration
-                time.sleep(0.2)
-                continue
-            
-            # Check for valid data
-            if hex(feedInfo['test_value'][0]) == '0x123456789abcdef':
-                robotMode = feedInfo['robot_mode'][0]
-                algorithm_queue = feedInfo['run_queued_cmd'][0]
-                enableStatus_robot = feedInfo['enable_status'][0]
-                robotErrorState = feedInfo['error_status'][0]
-                posizione_attuale = feedInfo['tool_vector_actual'][0]
-                angoli_attuali = feedInfo['q_actual'][0]
-        time.sleep(0.2)
-
-def stampaFeed(gui: MultiTerminalGUI):
+def stampaFeed(gui: MultiTerminalGUI, reader: FeedbackReader):
     """
     Thread function: prints the current robot status periodically.
     """
     while True:
+        snapshot = reader.latest
+        if snapshot is None:
+            time.sleep(0.2)
+            continue
         now_str = datetime.datetime.now().strftime("%H:%M:%S") + "\n"
-        status_str = f"Robot Mode: {robotMode}\n"
-        status_str += f"Robot Error State: {robotErrorState}\n"
-        status_str += f"Enable Status: {enableStatus_robot}\n"
-        status_str += f"Algorithm Queue: {algorithm_queue}\n"
-        status_str += "Coordinate attuali: " + converti_feed_in_string(posizione_attuale) + "\n"
-        status_str += "Angoli attuali: " + converti_feed_in_string(angoli_attuali) + "\n"
+        status_str = f"Robot Mode: {snapshot.robot_mode}\n"
+        status_str += f"Robot Error State: {bool(snapshot.error_status)}\n"
+        status_str += f"Enable Status: {snapshot.enable_status}\n"
+        status_str += f"Algorithm Queue: {snapshot.run_queued_cmd}\n"
+        status_str += "Coordinate attuali: " + converti_feed_in_string(snapshot.tool_vector_actual) + "\n"
+        status_str += "Angoli attuali: " + converti_feed_in_string(snapshot.q_actual) + "\n"
         gui.write_to_terminal(5, now_str + status_str)
         time.sleep(0.2)
 
-def ClearRobotError(dashboard: DobotApiDashboard, gui: MultiTerminalGUI):
+# Types of ErrorEvent
+EVENT_ERROR = "error"           # error_status went from 0 to 1
+EVENT_CLEARED = "cleared"       # error_status went back to 0
+
+# Clear policies, chosen per alarm level (the strictest policy among the active alarms wins)
+POLICY_AUTO = "auto"            # clear and continue immediately
+POLICY_CONFIRM = "confirm"      # ask the operator from the GUI
+POLICY_MANUAL = "manual"        # only report, the operator clears from the teach pendant
+_POLICY_RANK = {POLICY_AUTO: 0, POLICY_CONFIRM: 1, POLICY_MANUAL: 2}
+DEFAULT_CLEAR_POLICIES = {
+    5: POLICY_AUTO,             # planning alarms (singularity, no IK solution): the motion was just refused
+    1: POLICY_CONFIRM,
+    0: POLICY_CONFIRM,
+}
+ERROR_RECHECK_INTERVAL = 1.0    # s, while in error: re-read the ids to catch new alarms and failed clears
+MAX_AUTO_CLEARS = 3             # automatic clears of the same error before asking the operator
+
+
+class ErrorEvent(NamedTuple):
+    """Error transition published by ErrorSupervisor to its subscribers."""
+    kind: str                               # EVENT_ERROR or EVENT_CLEARED
+    snapshot: FeedbackSnapshot              # feedback packet where the transition was seen
+    error_ids: list                         # [controller ids, servo J1 ids, ..., servo J6 ids] from GetErrorID
+    alarms: list                            # decoded Alarm entries (unknown ids are skipped)
+    collision: bool
+    policy: Optional[str]                   # clear policy applied (None for EVENT_CLEARED)
+
+
+def parse_error_ids(reply: str) -> list:
     """
-    Thread function: monitors and clears robot errors if any.
+    Parse the reply of GetErrorID, e.g. "0,{[[22],[],[],[],[],[],[]]},GetErrorID();",
+    into [controller ids, servo J1 ids, ..., servo J6 ids].
+    Returns an empty list if the command failed (error code other than 0).
     """
-    global robotErrorState
-    # Load error descriptions
-    dataController, dataServo = alarmAlarmJsonFile()
-    while True:
-        error_lock.acquire()
-        if robotErrorState:
-            numbers = re.findall(r'-?\d+', dashboard.GetErrorID())
-            numbers = [int(num) for num in numbers]
-            if numbers and numbers[0] == 0:
-                if len(numbers) > 1:
-                    for i in numbers[1:]:
-                        alarmState = False
-                        if i == -2:
-                            gui.write_to_terminal(4, f"Robot in collisione, ID: {i}")
-                            alarmState = True
-                        if alarmState:
-                            continue
-                        # Check controller errors
-                        for item in dataController:
-                            if i == item["id"]:
-                                gui.write_to_terminal(4, f"Errore del controller, id: {i}, descrizione: {item['en']['description']}")
-                                alarmState = True
-                                break
-                        if alarmState:
-                            continue
-                        # Check servo errors
-                        for item in dataServo:
-                            if i == item["id"]:
-                                gui.write_to_terminal(4, f"Errore dei servomotori, id: {i}, descrizione: {item['en']['description']}")
-                                break
-
-                    # Prompt user to clear error
-                    choose = input("Inserisci 1 per ripulire gli errori del robot e far ripartire: ")
-                    if choose.strip() == "1":
-                        dashboard.ClearError()
-                        time.sleep(0.01)
-                        dashboard.Continue()
+    if not reply:
+        return []
+    code = re.match(r'\s*(-?\d+)', reply)
+    if code is None or int(code.group(1)) != 0:
+        return []
+    start, end = reply.find('{'), reply.rfind('}')
+    if start != -1 and end > start:
+        try:
+            ids = json.loads(reply[start + 1:end])
+            if isinstance(ids, list) and all(isinstance(group, list) for group in ids):
+                return ids
+        except ValueError:
+            pass
+    # Unknown layout: all the numbers after the error code, looked up as controller ids first
+    return [[int(n) for n in re.findall(r'-?\d+', reply[code.end():])]]
+
+
+class ErrorSupervisor:
+    """
+    Event-driven replacement of the old ClearRobotError polling thread.
+
+    It waits on the feedback stream and reacts to error_status transitions within one packet:
+    the error ids are read once with GetErrorID, decoded with the alarm catalogue and published
+    as ErrorEvent to the subscribers. Depending on the clear policy of the alarm level the error
+    is cleared automatically, after a confirmation asked in the GUI, or left to the operator.
+    Dashboard calls are serialised with error_lock and never run on the Tk thread.
+
+    While the robot stays in error the ids are read again every ERROR_RECHECK_INTERVAL seconds:
+    alarms raised in the meantime are decoded and handled, a failed GetErrorID is retried, and
+    if a clear did not remove the error the policy is applied again (after MAX_AUTO_CLEARS
+    automatic attempts the operator is asked). Confirmations given after the error has already
+    been cleared are dropped.
+    """
+
+    def __init__(self, dashboard: DobotApiDashboard, reader: FeedbackReader, gui: Optional[MultiTerminalGUI] = None,
+                 policies: Optional[dict] = None, collision_policy: str = POLICY_CONFIRM, language: str = "en"):
+        self.dashboard = dashboard
+        self.reader = reader
+        self.gui = gui
+        self.policies = dict(DEFAULT_CLEAR_POLICIES if policies is None else policies)
+        self.collision_policy = collision_policy
+        self.language = language
+        self.catalogue = get_catalogue()
+        self.last_event: Optional[ErrorEvent] = None
+        self._subscribers: List[Callable[[ErrorEvent], None]] = []
+        self._clear_requests = queue.Queue()
+        self._in_error = False
+        self._generation = 0            # incremented at every transition, confirmations carry the one they were asked in
+        self._known = set()             # (group, id) pairs already reported in the current error
+        self._reported = False          # the current error has been decoded and handled at least once
+        self._clear_attempted = False   # a clear was sent since the last handling
+        self._auto_clears = 0
+        self._recheck_at = 0.0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, callback: Callable[[ErrorEvent], None]):
+        """Register a callback called (from the supervisor thread) at every ErrorEvent."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[ErrorEvent], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def start(self):
+        """Start the supervisor thread if it is not already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="ErrorThread", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request_clear(self, generation: Optional[int] = None):
+        """
+        Ask the supervisor thread to clear the errors and continue (thread-safe, non-blocking).
+        With generation (the error the confirmation was asked for) the request is dropped if that
+        error is over in the meantime.
+        """
+        self._clear_requests.put(generation)
+
+    def _log(self, text: str):
+        if self.gui is not None:
+            self.gui.write_to_terminal(4, text)
+
+    def _run(self):
+        while self._running:
+            # Wake up at the first packet whose error state differs from the known one
+            snapshot = self.reader.wait_for(lambda s: bool(s.error_status) != self._in_error, timeout=0.1)
+            try:
+                if snapshot is not None:
+                    self._on_transition(snapshot)
+                elif self._in_error and time.monotonic() >= self._recheck_at:
+                    self._check_errors(self.reader.latest)
+                self._process_clear_requests()
+            except Exception as e:
+                # Dashboard or decoding failure: retried at the next recheck while the robot is in error
+                self._log(f"Supervisore errori - {e}")
+
+    def _on_transition(self, snapshot: FeedbackSnapshot):
+        self._in_error = bool(snapshot.error_status)
+        self._generation += 1
+        if self._in_error:
+            self._known = set()
+            self._reported = False
+            self._clear_attempted = False
+            self._auto_clears = 0
+            self._check_errors(snapshot)
         else:
-            # If no error, continue execution when ready
+            self._publish(ErrorEvent(EVENT_CLEARED, snapshot, [], [], False, None))
+            self._log("Errori del robot risolti.")
+
+    def _check_errors(self, snapshot: FeedbackSnapshot):
+        """Read the error ids and handle the new alarms, or all of them again after a failed clear."""
+        self._recheck_at = time.monotonic() + ERROR_RECHECK_INTERVAL    # set first, so a failure is retried
+        with error_lock:
+            error_ids = parse_error_ids(self.dashboard.GetErrorID())
+        current = {(group, i) for group, ids in enumerate(error_ids) for i in ids}
+        new = current - self._known
+        if self._reported and not new and not self._clear_attempted:
+            return                  # same alarms, already reported (operator answer pending or manual clear)
+        retry = self._reported and not new
+        if retry:
+            self._log("Errore ancora presente dopo la pulizia.")
+        self._known |= current
+        self._reported = True
+        self._clear_attempted = False
+        self._on_error(snapshot, error_ids, current if retry else new)
+
+    def _on_error(self, snapshot: FeedbackSnapshot, error_ids: list, report: set):
+        collision = False
+        alarms = []
+        for group, ids in enumerate(error_ids):
+            source = None if len(error_ids) == 1 else (SOURCE_CONTROLLER if group == 0 else SOURCE_SERVO)
+            for i in ids:
+                if (group, i) not in report:
+                    continue
+                if i == COLLISION_ID:
+                    collision = True
+                    self._log(f"Robot in collisione, ID: {i}")
+                    continue
+                alarm = self.catalogue.get(i, source)
+                if alarm is None:
+                    self._log(f"Errore sconosciuto, id: {i}")
+                    continue
+                alarms.append(alarm)
+                if alarm.source == SOURCE_CONTROLLER:
+                    self._log(f"Errore del controller, id: {i}, descrizione: {alarm.description(self.language)}")
+                else:
+                    self._log(f"Errore dei servomotori (J{group}), id: {i}, descrizione: {alarm.description(self.language)}")
+
+        policy = self._policy(alarms, collision)
+        if policy == POLICY_AUTO and self._auto_clears >= MAX_AUTO_CLEARS:
+            self._log(f"Errore non risolto dopo {MAX_AUTO_CLEARS} pulizie automatiche, serve la conferma dell'operatore.")
+            policy = POLICY_CONFIRM
+        event = ErrorEvent(EVENT_ERROR, snapshot, error_ids, alarms, collision, policy)
+        self._publish(event)
+
+        if policy == POLICY_AUTO:
+            self._log("Errore ripulito automaticamente.")
+            self._auto_clears += 1
+            self._try_clear()
+        elif policy == POLICY_CONFIRM and self.gui is not None:
+            details = "\n".join(f"[{a.id}] {a.description(self.language)}" for a in alarms)
+            if collision:
+                details = "Robot in collisione\n" + details
+            generation = self._generation
+            self.gui.ask_confirmation(
+                "Errore del robot",
+                f"{details}\n\nRipulire gli errori del robot e farlo ripartire?",
+                lambda ok: self.request_clear(generation) if ok else self._log("Errori non ripuliti dall'operatore."))
+        else:
+            self._log("Ripulire gli errori dal teach pendant.")
+
+    def _process_clear_requests(self):
+        while True:
+            try:
+                generation = self._clear_requests.get_nowait()
+            except queue.Empty:
+                return
+            latest = self.reader.latest
+            if not self._in_error or (latest is not None and not latest.error_status) \
+                    or (generation is not None and generation != self._generation):
+                self._log("Conferma ignorata: l'errore è già stato risolto.")
+                continue
+            self._try_clear()
+
+    def _try_clear(self):
+        """Send the clear; the next recheck handles the error again if it is still there (or if this raises)."""
+        self._clear_attempted = True
+        self._recheck_at = time.monotonic() + ERROR_RECHECK_INTERVAL
+        self._clear()
+
+    def _policy(self, alarms: list, collision: bool) -> str:
+        policies = [self.policies.get(a.level, POLICY_CONFIRM) for a in alarms]
+        if collision:
+            policies.append(self.collision_policy)
+        if not policies:            # error with no decodable id
+            return POLICY_CONFIRM
+        return max(policies, key=_POLICY_RANK.get)
+
+    def _clear(self):
+        with error_lock:
+            self.dashboard.ClearError()
+            time.sleep(0.01)
+            self.dashboard.Continue()
+
+    def _publish(self, event: ErrorEvent):
+        self.last_event = event
+        for callback in list(self._subscribers):
             try:
-                if int(enableStatus_robot) == 1 and int(algorithm_queue) == 0:
-                    dashboard.Continue()
-            except Exception:
-                pass
-        error_lock.release()
-        time.sleep(3)
+                callback(event)
+            except Exception as e:
+                self._log(f"Supervisore errori - errore in un subscriber: {e}")
@@ -0,0 +1,257 @@
+# kinematics.py
+
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Denavit-Hartenberg parameters of the Dobot CR5 (mm, rad), UR-like structure
+CR5_D = np.array([147.0, 0.0, 0.0, 141.0, 116.0, 105.0])
+CR5_A = np.array([0.0, -427.0, -357.0, 0.0, 0.0, 0.0])
+CR5_ALPHA = np.array([np.pi / 2, 0.0, 0.0, np.pi / 2, -np.pi / 2, 0.0])
+
+# Offset between the Dobot joint angles and the DH theta (theta = q + offset)
+JOINT_OFFSETS = np.radians([0.0, -90.0, 0.0, -90.0, 0.0, 0.0])
+
+# Joint limits in degrees [min, max]
+JOINT_LIMITS = np.array([
+    [-360.0, 360.0],
+    [-360.0, 360.0],
+    [-160.0, 160.0],
+    [-360.0, 360.0],
+    [-360.0, 360.0],
+    [-360.0, 360.0],
+])
+
+_EPS = 1e-9
+
+
+def pose_to_matrix(poses) -> np.ndarray:
+    """
+    Convert Dobot poses [x, y, z, rx, ry, rz] (mm, deg, static xyz Euler angles) to
+    homogeneous matrices. Accepts shape (6,) or (N, 6), returns (N, 4, 4).
+    """
+    poses = np.atleast_2d(np.asarray(poses, dtype=float))
+    rx, ry, rz = np.radians(poses[:, 3:6]).T
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+
+    T = np.zeros((len(poses), 4, 4))
+    # R = Rz(rz) @ Ry(ry) @ Rx(rx)
+    T[:, 0, 0] = cz * cy
+    T[:, 0, 1] = cz * sy * sx - sz * cx
+    T[:, 0, 2] = cz * sy * cx + sz * sx
+    T[:, 1, 0] = sz * cy
+    T[:, 1, 1] = sz * sy * sx + cz * cx
+    T[:, 1, 2] = sz * sy * cx - cz * sx
+    T[:, 2, 0] = -sy
+    T[:, 2, 1] = cy * sx
+    T[:, 2, 2] = cy * cx
+    T[:, :3, 3] = poses[:, :3]
+    T[:, 3, 3] = 1.0
+    return T
+
+
+def matrix_to_pose(T) -> np.ndarray:
+    """Inverse of pose_to_matrix: (N, 4, 4) or (4, 4) matrices to (N, 6) Dobot poses."""
+    T = np.asarray(T, dtype=float).reshape(-1, 4, 4)
+    ry = np.arcsin(np.clip(-T[:, 2, 0], -1.0, 1.0))
+    rx = np.arctan2(T[:, 2, 1], T[:, 2, 2])
+    rz = np.arctan2(T[:, 1, 0], T[:, 0, 0])
+    return np.column_stack([T[:, :3, 3], np.degrees(np.column_stack([rx, ry, rz]))])
+
+
+def _dh_matrices(theta: np.ndarray, joint: int) -> np.ndarray:
+    """DH transform of a single joint for a batch of theta values (rad), shape (N, 4, 4)."""
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(CR5_ALPHA[joint]), np.sin(CR5_ALPHA[joint])
+    T = np.zeros(theta.shape + (4, 4))
+    T[..., 0, 0] = ct
+    T[..., 0, 1] = -st * ca
+    T[..., 0, 2] = st * sa
+    T[..., 0, 3] = CR5_A[joint] * ct
+    T[..., 1, 0] = st
+    T[..., 1, 1] = ct * ca
+    T[..., 1, 2] = -ct * sa
+    T[..., 1, 3] = CR5_A[joint] * st
+    T[..., 2, 1] = sa
+    T[..., 2, 2] = ca
+    T[..., 2, 3] = CR5_D[joint]
+    T[..., 3, 3] = 1.0
+    return T
+
+
+def forward_matrix(joints) -> np.ndarray:
+    """Forward kinematics: joint angles (deg), shape (6,) or (N, 6), to flange matrices (N, 4, 4)."""
+    theta = np.radians(np.atleast_2d(np.asarray(joints, dtype=float))) + JOINT_OFFSETS
+    T = _dh_matrices(theta[:, 0], 0)
+    for j in range(1, 6):
+        T = T @ _dh_matrices(theta[:, j], j)
+    return T
+
+
+def forward(joints) -> np.ndarray:
+    """Forward kinematics: joint angles (deg), shape (6,) or (N, 6), to Dobot poses (N, 6)."""
+    return matrix_to_pose(forward_matrix(joints))
+
+
+def inverse_all(poses) -> np.ndarray:
+    """
+    Analytic inverse kinematics for a batch of poses.
+
+    Returns an array (N, 8, 6) with the eight shoulder/elbow/wrist configurations in degrees
+    (Dobot convention, wrapped to [-180, 180)); unreachable configurations are NaN.
+    """
+    T = pose_to_matrix(poses)
+    n = len(T)
+    d1, d4, d5, d6 = CR5_D[0], CR5_D[3], CR5_D[4], CR5_D[5]
+    a2, a3 = CR5_A[1], CR5_A[2]
+
+    # Wrist center (origin of frame 5)
+    p05 = T[:, :3, 3] - d6 * T[:, :3, 2]
+    r = np.hypot(p05[:, 0], p05[:, 1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        psi = np.arctan2(p05[:, 1], p05[:, 0])
+        phi = np.arccos(d4 / r)
+    # theta1: two shoulder solutions, shape (n, 2)
+    t1 = psi[:, None] + np.stack([phi, -phi], axis=1) + np.pi / 2
+
+    # Broadcast to 8 branches: index = 4 * shoulder + 2 * wrist + elbow
+    shoulder = np.array([0, 0, 0, 0, 1, 1, 1, 1])
+    wrist = np.array([0, 0, 1, 1, 0, 0, 1, 1])
+    elbow = np.array([0, 1, 0, 1, 0, 1, 0, 1])
+    t1 = t1[:, shoulder]                                            # (n, 8)
+    s1, c1 = np.sin(t1), np.cos(t1)
+
+    px, py = T[:, None, 0, 3], T[:, None, 1, 3]
+    with np.errstate(invalid='ignore'):
+        t5 = np.arccos((px * s1 - py * c1 - d4) / d6)
+    t5 = np.where(wrist == 0, t5, -t5)
+    s5 = np.sin(t5)
+
+    # theta6 from the inverse transform T60; undefined at the wrist singularity (s5 = 0)
+    Tinv = np.linalg.inv(T)
+    x60 = Tinv[:, None, :3, 0]
+    y60 = Tinv[:, None, :3, 1]
+    safe_s5 = np.where(np.abs(s5) < _EPS, 1.0, s5)
+    t6 = np.arctan2((-x60[..., 1] * s1 + y60[..., 1] * c1) / safe_s5,
+                    (x60[..., 0] * s1 - y60[..., 0] * c1) / safe_s5)
+    t6 = np.where(np.abs(s5) < _EPS, 0.0, t6)
+
+    # Planar 3R problem for theta2, theta3, theta4
+    T01 = _dh_matrices(t1, 0)
+    T45 = _dh_matrices(t5, 4)
+    T56 = _dh_matrices(t6, 5)
+    T14 = np.linalg.inv(T01) @ T[:, None] @ np.linalg.inv(T45 @ T56)
+    p13 = T14[..., :3, 3] - d4 * T14[..., :3, 1]
+    p13_norm = np.linalg.norm(p13, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t3 = np.arccos((p13_norm ** 2 - a2 ** 2 - a3 ** 2) / (2 * a2 * a3))
+        t3 = np.where(elbow == 0, t3, -t3)
+        t2 = -np.arctan2(p13[..., 1], -p13[..., 0]) + np.arcsin(a3 * np.sin(t3) / p13_norm)
+    T12 = _dh_matrices(t2, 1)
+    T23 = _dh_matrices(t3, 2)
+    T34 = np.linalg.inv(T12 @ T23) @ T14
+    t4 = np.arctan2(T34[..., 1, 0], T34[..., 0, 0])
+
+    theta = np.stack([t1, t2, t3, t4, t5, t6], axis=-1)             # (n, 8, 6)
+    q = np.degrees(theta - JOINT_OFFSETS)
+    q = (q + 180.0) % 360.0 - 180.0
+
+    # Discard numerical ghosts: check the solutions against the forward kinematics
+    flat = q.reshape(-1, 6)
+    valid = np.all(np.isfinite(flat), axis=1)
+    check = np.full((len(flat), 4, 4), np.nan)
+    if valid.any():
+        check[valid] = forward_matrix(flat[valid])
+    err = np.linalg.norm(check[:, :3, 3] - np.repeat(T[:, :3, 3], 8, axis=0), axis=1)
+    err += np.linalg.norm(check[:, :3, :3] - np.repeat(T[:, :3, :3], 8, axis=0), axis=(1, 2)) * 100.0
+    flat[~(err < 1e-3)] = np.nan
+    return flat.reshape(n, 8, 6)
+
+
+def select_solution(solutions: np.ndarray, seed=None) -> np.ndarray:
+    """
+    Pick, for each pose, the configuration of `solutions` (N, 8, 6) closest in joint space
+    to `seed` (deg, shape (6,) or (N, 6)), shifting each joint by multiples of 360 deg towards
+    the seed when the limits allow it. Rows without a valid solution are NaN.
+    """
+    n = len(solutions)
+    seed = np.zeros((n, 6)) if seed is None else np.broadcast_to(np.asarray(seed, dtype=float), (n, 6))
+    near = solutions + 360.0 * np.round((seed[:, None, :] - solutions) / 360.0)
+    in_limits = (near >= JOINT_LIMITS[:, 0]) & (near <= JOINT_LIMITS[:, 1])
+    candidates = np.where(in_limits, near, solutions)
+    candidates[~np.all((candidates >= JOINT_LIMITS[:, 0]) & (candidates <= JOINT_LIMITS[:, 1]), axis=2)] = np.nan
+
+    dist = np.abs(candidates - seed[:, None, :]).sum(axis=2)
+    dist = np.where(np.isnan(dist), np.inf, dist)
+    best = np.argmin(dist, axis=1)
+    result = candidates[np.arange(n), best]
+    result[~np.isfinite(dist[np.arange(n), best])] = np.nan
+    return result
+
+
+def inverse(poses, seed=None) -> np.ndarray:
+    """Inverse kinematics for a batch of poses (N, 6), returning the solution closest to seed, shape (N, 6)."""
+    return select_solution(inverse_all(poses), seed)
+
+
+class KinematicsSolver:
+    """
+    Local inverse kinematics with an LRU cache keyed on quantised poses.
+    The cache stores all eight configurations of a pose, so the seed-dependent choice stays exact.
+    """
+
+    def __init__(self, cache_size: int = 4096, quantum: float = 0.01):
+        self.cache_size = cache_size
+        self.quantum = quantum          # quantisation step of the cache key (mm and deg)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, pose: np.ndarray) -> tuple:
+        return tuple(np.round(pose / self.quantum).astype(np.int64).tolist())
+
+    def inverse_all(self, poses) -> np.ndarray:
+        """Cached version of kinematics.inverse_all, shape (N, 8, 6)."""
+        poses = np.atleast_2d(np.asarray(poses, dtype=float))
+        keys = [self._key(p) for p in poses]
+        result = np.empty((len(poses), 8, 6))
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    result[i] = cached
+            self.hits += len(poses) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            solved = inverse_all(poses[missing])        # one vectorised pass for all the misses
+            result[missing] = solved
+            with self._lock:
+                for i, sol in zip(missing, solved):
+                    self._cache[keys[i]] = sol
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def inverse(self, poses, seed=None) -> np.ndarray:
+        """Joint angles (deg) closest to seed for each pose, shape (N, 6); NaN rows are unreachable."""
+        return select_solution(self.inverse_all(poses), seed)
+
+    def forward(self, joints) -> np.ndarray:
+        """Forward kinematics, shape (N, 6)."""
+        return forward(joints)
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,244 @@
+# log_sink.py
+
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+FLUSH_BYTES = 64 * 1024         # byte accumulati per file prima della scrittura su disco
+FLUSH_INTERVAL = 2.0            # s, tempo massimo di permanenza di un messaggio in memoria
+MAX_FILE_BYTES = 10 * 1024 * 1024   # dimensione oltre la quale un file di log viene ruotato (None = mai)
+KEEP_RUNS = 20                  # cartelle di esecuzione mantenute nella directory dei log (None = tutte)
+MAX_PENDING_BYTES = 16 * 1024 * 1024    # byte mantenuti per file mentre il disco non risponde, oltre si scartano i più vecchi
+RUN_PREFIX = "run_"
+
+
+class LogSink:
+    """
+    Scrittura asincrona dei file di log dei terminali.
+
+    write() si limita ad accodare il testo; un unico thread daemon lo accumula per file e lo scrive
+    su disco quando sono accumulati FLUSH_BYTES o è passato FLUSH_INTERVAL, così il thread della GUI
+    non attende mai il disco e non c'è un flush per ogni messaggio.
+
+    Ogni esecuzione ha la propria cartella log_dir/run_YYYYmmdd_HHMMSS, quindi i log delle esecuzioni
+    precedenti sono mantenuti (le cartelle più vecchie oltre keep_runs vengono rimosse). Un file viene
+    ruotato in <nome>.<n>.log quando supera max_bytes o, con rotate_daily, al cambio di data; con compress
+    i file ruotati sono compressi con gzip. Le dimensioni sono contate in byte UTF-8.
+
+    Se una scrittura fallisce il testo resta in memoria (fino a MAX_PENDING_BYTES per file) e il file
+    viene riaperto, così il flush successivo riprova; il primo errore di ogni serie è passato a
+    on_error (ad esempio il terminale degli errori della GUI).
+    """
+
+    def __init__(self, log_dir, names: Dict[int, str], flush_bytes: int = FLUSH_BYTES,
+                 flush_interval: float = FLUSH_INTERVAL, max_bytes: Optional[int] = MAX_FILE_BYTES,
+                 rotate_daily: bool = True, compress: bool = True, keep_runs: Optional[int] = KEEP_RUNS,
+                 on_error: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            log_dir: Directory dei log (contiene una cartella per esecuzione)
+            names: id del file -> nome base del file (senza estensione)
+            flush_bytes: Byte accumulati per file prima della scrittura su disco
+            flush_interval: Secondi massimi prima della scrittura su disco
+            max_bytes: Dimensione oltre la quale il file viene ruotato (None = mai)
+            rotate_daily: Ruota i file al cambio di data
+            compress: Comprime con gzip i file ruotati
+            keep_runs: Cartelle di esecuzione mantenute (None = tutte)
+            on_error: Funzione chiamata con il messaggio del primo errore di scrittura di ogni serie
+        """
+        self.log_dir = Path(log_dir)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.on_error = on_error
+        self.dropped = 0            # messaggi scritti dopo close() o scartati mentre il disco non risponde
+        self.errors = 0
+        self.last_error: Optional[Exception] = None
+        self._failing = set()       # file con un errore già segnalato, fino alla prossima scrittura riuscita
+
+        stamp = datetime.now().strftime(f"{RUN_PREFIX}%Y%m%d_%H%M%S")
+        self.run_dir = self.log_dir / stamp
+        suffix = 1
+        while self.run_dir.exists():            # due avvii nello stesso secondo
+            self.run_dir = self.log_dir / f"{stamp}_{suffix}"
+            suffix += 1
+        self.run_dir.mkdir(parents=True)
+        if keep_runs is not None:
+            self._prune_runs(keep_runs)
+
+        self.paths = {i: self.run_dir / f"{name}.log" for i, name in names.items()}
+        self._files = {i: open(p, 'ab') for i, p in self.paths.items()}
+        self._sizes = {i: 0 for i in self.paths}
+        self._rolled = {i: 0 for i in self.paths}
+        self._day = date.today()
+        self._buffers = {i: [] for i in self.paths}
+        self._buffered = {i: 0 for i in self.paths}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="LogSink", daemon=True)
+        self._thread.start()
+
+    def _prune_runs(self, keep: int):
+        runs = sorted(p for p in self.log_dir.iterdir()
+                      if p.is_dir() and p.name.startswith(RUN_PREFIX) and p != self.run_dir)
+        for old in runs[:max(len(runs) - keep + 1, 0)]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    # --- API (qualsiasi thread) ---
+
+    def write(self, file_id: int, text: str):
+        """Accoda il testo per il file indicato (non blocca)."""
+        if self._closed:
+            self.dropped += 1
+            return
+        self._queue.put((file_id, text))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Scrive su disco tutto ciò che è stato accodato finora. Ritorna False allo scadere del timeout."""
+        if not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Scrive i messaggi in coda, chiude i file e ferma il thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # --- thread di scrittura ---
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            try:
+                if item is None:
+                    self._flush_all()
+                    self._close_files()
+                    return
+                if isinstance(item, threading.Event):
+                    self._flush_all()
+                    item.set()
+                    last_flush = time.monotonic()
+                elif item:
+                    file_id, text = item
+                    data = text.encode('utf-8')
+                    self._buffers[file_id].append(data)
+                    self._buffered[file_id] += len(data)
+                    if self._buffered[file_id] >= self.flush_bytes:
+                        self._flush_file(file_id)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self._flush_all()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                self._report(e)
+
+    def _report(self, error: Exception, file_id: Optional[int] = None):
+        self.errors += 1
+        self.last_error = error
+        if file_id in self._failing:
+            return
+        self._failing.add(file_id)
+        name = self.paths[file_id].name if file_id is not None else "log"
+        if self.on_error is not None:
+            try:
+                self.on_error(f"LogSink - Errore di scrittura di {name}: {error}")
+            except Exception:
+                pass
+
+    def _flush_all(self):
+        if self.rotate_daily and date.today() != self._day:
+            self._day = date.today()
+            for file_id in self._files:
+                if self._sizes[file_id] > 0 or self._buffered[file_id] > 0:
+                    self._flush_file(file_id)
+                    try:
+                        self._roll(file_id)
+                    except Exception as e:
+                        self._report(e, file_id)
+                        self._reopen(file_id)
+        for file_id in self._files:
+            self._flush_file(file_id)
+
+    def _flush_file(self, file_id: int):
+        """Scrive il buffer di un file; se fallisce il buffer resta per il flush successivo e il file viene riaperto."""
+        if not self._buffers[file_id]:
+            return
+        data = b''.join(self._buffers[file_id])
+        try:
+            if self.max_bytes is not None and self._sizes[file_id] > 0 \
+                    and self._sizes[file_id] + len(data) > self.max_bytes:
+                self._roll(file_id)
+            f = self._files[file_id]
+            f.write(data)
+            f.flush()
+        except Exception as e:
+            self._report(e, file_id)
+            self._reopen(file_id)
+            self._buffers[file_id] = [data]
+            self._trim_pending(file_id)
+            return
+        self._buffers[file_id].clear()
+        self._buffered[file_id] = 0
+        self._sizes[file_id] += len(data)
+        self._failing.discard(file_id)
+
+    def _trim_pending(self, file_id: int):
+        """Limita il testo mantenuto mentre le scritture falliscono, scartando i byte più vecchi."""
+        data = self._buffers[file_id][0]
+        if len(data) > MAX_PENDING_BYTES:
+            self.dropped += 1
+            data = data[-MAX_PENDING_BYTES:]
+            self._buffers[file_id] = [data]
+        self._buffered[file_id] = len(data)
+
+    def _reopen(self, file_id: int):
+        try:
+            self._files[file_id].close()
+        except Exception:
+            pass
+        try:
+            self._files[file_id] = open(self.paths[file_id], 'ab')
+            self._sizes[file_id] = self.paths[file_id].stat().st_size
+        except OSError as e:
+            self._report(e, file_id)    # con il file chiuso il flush successivo fallisce e riprova
+
+    def _roll(self, file_id: int):
+        """Chiude il file corrente, lo rinomina in <nome>.<n>.log (compresso se richiesto) e ne apre uno nuovo."""
+        path = self.paths[file_id]
+        self._files[file_id].close()
+        rolled = path.with_name(f"{path.stem}.{self._rolled[file_id] + 1}{path.suffix}")
+        os.replace(path, rolled)
+        self._rolled[file_id] += 1
+        self._files[file_id] = open(path, 'ab')
+        self._sizes[file_id] = 0
+        if self.compress:
+            try:
+                with open(rolled, 'rb') as src, gzip.open(f"{rolled}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rolled)
+            except OSError as e:        # il file ruotato resta non compresso
+                self._report(e, file_id)
+
+    def _close_files(self):
+        for f in self._files.values():
+            try:
+                f.close()
+            except OSError:
+                pass
@@ -6,13 +6,14 @@ import tkinter as tk
 from transforms3d.euler import euler2quat
 import numpy as np
 
-from camera_handler_class import CameraHandler
 import percorsi_robot
 from robot_controller_class import RobotController
 import feed_thread
 from multi_terminal_gui_class import MultiTerminalGUI
 from pose_class import Pose
 
+TELEMETRY_LOG = False       # registra il feedback in formato binario (circa 40 kB/s) per l'analisi offline
+
 global dobot
 global zed
 global gui
@@ -21,24 +22,23 @@ def avvia_programma():
     global dobot, zed, gui
     
     try:
-        dobot = RobotController(gui)
+        # Telemetria binaria (8 ms) salvata nella cartella dei log di questa esecuzione, se abilitata
+        dobot = RobotController(gui, telemetry_log_dir=gui.log_sink.run_dir if TELEMETRY_LOG else None)
         gui.write_to_terminal(0, f"Connessione al robot eseguita!")
     except Exception as e:
         gui.write_to_terminal(4, f"Connessione al robot fallita: {str(e)}")
         return
 
-    # Initialize camera
-    zed = CameraHandler()
+    # Camera shared with the scan routines, so detection and recording reuse the same ZED session
+    zed = percorsi_robot.zed
     gui.write_to_terminal(2, f"Creazione della camera eseguita!")
 
     # Start feedback threads
-    thread_feed = threading.Thread(target=feed_thread.GetFeed200ms, args=(dobot.feedFour,), name="FeedbackThread")
-    thread_feed.daemon = True
-    thread_feed.start()
+    dobot.feedback.start()
 
-    thread_error = threading.Thread(target=feed_thread.ClearRobotError, args=(dobot.dashboard, gui), name="ErrorThread")
-    thread_error.daemon = True
-    thread_error.start()
+    # Error supervisor: reacts to error_status changes in the feedback, clearing is confirmed from the GUI
+    error_supervisor = feed_thread.ErrorSupervisor(dobot.dashboard, dobot.feedback, gui)
+    error_supervisor.start()
 
     # Prepare initial pose to send to camera
     CORD_RIPOSO = [142.000000, 19.500000, 314.800000, 180.000000, 0.000000, -180.000000]
@@ -59,8 +59,10 @@ def avvia_programma():
     gui.write_to_terminal(0, "Abilitazione completata :)")
     
     try:
-        dobot.dashboard.SpeedFactor(30)
-        dobot.dashboard.SpeedJ(40)
+        # Comandi di setup inviati in un unico batch (un round trip invece di uno per comando)
+        with dobot.dashboard.pipeline():
+            dobot.dashboard.SpeedFactor(30)
+            dobot.dashboard.SpeedJ(40)
         gui.write_to_terminal(0, "Velocità settata")
     except Exception:
         pass
@@ -109,14 +111,19 @@ def find_plant(plants_number: int):
     pose.orientation.z = quat[3]
     pose.orientation.w = quat[0]
     
+    # Le bbox sono riportate nel sistema di riferimento della base usando la posa reale del TCP letta dal feedback
+    actual = dobot.feedback.latest
     try:
-        list_of_plants = zed.scan_and_find_plants(pose, plants_number, gui, bbox_type="y")
+        list_of_plants = zed.scan_and_find_plants(pose, plants_number, gui, bbox_type="y",
+                                                  tcp_pose=actual if actual is not None else HIGH_VISION_POSE)
     except Exception as e:
        gui.write_to_terminal(4, f"Errore durante la scansione: {e}")
        return []
 
-    #usato per test se la camera sballa i valori
-    list_of_plants = [[300.0, 300.0, 200.0, 100.0, 100.0, 100.0], [-300.0, 300.0, 200.0, 100.0, 100.0, 100.0]]
+    # Senza calibrazione hand-eye le bbox non sono nel sistema della base: si usano i valori di test
+    if not zed.extrinsics.calibrated:
+        gui.write_to_terminal(4, "Calibrazione hand-eye assente: uso le bbox di test al posto di quelle rilevate.")
+        list_of_plants = np.array([[300.0, 300.0, 200.0, 100.0, 100.0, 100.0], [-300.0, 300.0, 200.0, 100.0, 100.0, 100.0]])
 
     return list_of_plants
     
@@ -130,9 +137,27 @@ def scan_and_record(plant_position: list, plant_name: str):
     gui.write_to_terminal(0, f"Main - Start scan and record for {plant_name}.")
     
     # Frame necessari: 630. Attualmente il movimento completo con questa velocità è di 42 secondi
-    percorsi_robot.scan_plant(plant_position, plant_name, dobot, gui, frames_to_record=630)
+    if percorsi_robot.scan_plant(plant_position, plant_name, dobot, gui, frames_to_record=630):
+        gui.write_to_terminal(0, f"Main - Scan and record for {plant_name} completed.")
+    else:
+        gui.write_to_terminal(0, f"Main - Scan and record for {plant_name} failed.")
+    
+def scan_and_record_all(list_of_plants: list):
+    global dobot, gui
+    
+    if dobot is None:
+        gui.write_to_terminal(4, "Robot non inizializzato.")
+        return
     
-    gui.write_to_terminal(0, f"Main - Scan and record for {plant_name} completed.")
+    gui.write_to_terminal(0, f"Main - Start batch scan of {len(list_of_plants)} plants.")
+    gui.set_status("SCANNING...", "green")
+    try:
+        failed = percorsi_robot.scan_plants(list_of_plants, dobot, gui, frames_to_record=630)
+        gui.write_to_terminal(0, f"Main - Batch scan completed, {len(list_of_plants) - len(failed)}/{len(list_of_plants)} plants recorded.")
+    except Exception as e:
+        gui.write_to_terminal(4, f"Errore durante la scansione delle piantine: {e}")
+    finally:
+        gui.set_status("READY", "yellow")
     
 def _make_thread_runner(target, *args, daemon=True):
     """
@@ -233,7 +258,7 @@ def main():
             def scan_task():
                 list_of_plants = find_plant(n)    #Restituisce un dizionario con punti estremi delle varie bounding box
 
-                if not list_of_plants or len(list_of_plants) == 0:
+                if list_of_plants is None or len(list_of_plants) == 0:
                     gui.write_to_terminal(4, "[Scan] ❌ Nessuna pianta trovata dalla camera oppure errore occorso nella scansione")
                     gui.set_status("READY", "yellow")
                     return
@@ -265,6 +290,16 @@ def main():
                     )
                     scan_title.pack(pady=5)
 
+                    # Pulsante per scansionare tutte le piante in un'unica esecuzione
+                    scan_all_btn = gui._create_styled_button(
+                        gui.scan_buttons_frame,
+                        text="🌱 SCANSIONA TUTTE",
+                        command=_make_thread_runner(scan_and_record_all, list_of_plants),
+                        width=18,
+                        color_type='primary'
+                    )
+                    scan_all_btn.pack(fill=tk.X, padx=10, pady=3)
+
                     for i in range(n):
                         def make_handler(idx): 
                             print(f"creando pulsante con pianta {idx}: {list_of_plants[idx]}")
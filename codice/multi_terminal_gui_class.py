@@ -1,5 +1,5 @@
 import tkinter as tk
-from tkinter import scrolledtext, ttk
+from tkinter import messagebox, scrolledtext, ttk
 import threading
 import queue
 import time
@@ -7,6 +7,13 @@ from datetime import datetime
 from pathlib import Path
 import atexit
 
+from log_sink import LogSink
+
+SCROLLBACK_LINES = 1000     # linee mantenute in ogni terminale
+SCROLLBACK_TRIM_FRACTION = 0.2  # eccesso tollerato (frazione dello scrollback) prima di tagliare a blocchi
+RENDER_HZ = 60              # ridisegni al secondo dei terminali (frequenza tipica dello schermo)
+FLASH_DURATION = 0.1        # secondi di lampeggio dell'indicatore di attività
+
 
 class MultiTerminalGUI:
     """
@@ -14,7 +21,8 @@ class MultiTerminalGUI:
     che ricevono dati da thread separati e salvano automaticamente su file.
     """
     
-    def __init__(self, master=None, terminal_titles=None, log_directory="log_files"):
+    def __init__(self, master=None, terminal_titles=None, log_directory="log_files", render_hz=RENDER_HZ,
+                 scrollback=SCROLLBACK_LINES, log_options=None):
         """
         Inizializza l'interfaccia multi-terminale.
         
@@ -22,6 +30,9 @@ class MultiTerminalGUI:
             master: Finestra root di tkinter (None per crearne una nuova)
             terminal_titles: Lista di 6 titoli per i terminali
             log_directory: Directory dove salvare i file di log
+            render_hz: Frequenza massima di ridisegno dei terminali
+            scrollback: Linee mantenute per terminale (un intero per tutti o una lista di 6 valori)
+            log_options: Parametri aggiuntivi per LogSink (flush, rotazione, compressione, esecuzioni mantenute)
         """
         # Definizione palette colori moderna
         self.colors = {
@@ -70,13 +81,14 @@ class MultiTerminalGUI:
         # Dizionari per gestire terminali e code
         self.terminals = {}
         self.queues = {}
-        self.file_locks = {}
+        if isinstance(scrollback, int):
+            scrollback = [scrollback] * len(self.terminal_titles)
+        self.scrollback = {i: max(1, int(n)) for i, n in enumerate(scrollback)}
         
         # Setup directory e file di log
         self.log_dir = Path(log_directory)
         self.log_dir.mkdir(exist_ok=True)
-        self.log_files = {}
-        self._setup_log_files()
+        self._setup_log_files(log_options or {})
         
         # Flag per gestire lo shutdown
         self.running = True
@@ -87,9 +99,10 @@ class MultiTerminalGUI:
         # Setup interfaccia
         self._setup_gui()
         
-        # Avvia thread di aggiornamento GUI
-        self.update_thread = threading.Thread(target=self._update_terminals, daemon=True)
-        self.update_thread.start()
+        # Avvia il ciclo di rendering dei terminali nel thread della GUI
+        self.render_interval = max(1, int(1000 / render_hz))   # ms tra due ridisegni
+        self._flash_until = {}      # terminal_id -> istante di fine lampeggio dell'indicatore
+        self.root.after(self.render_interval, self._render_terminals)
         
         # Registra cleanup all'uscita
         atexit.register(self.cleanup)
@@ -116,17 +129,14 @@ class MultiTerminalGUI:
             font=("Segoe UI", 10, "bold")
         )
     
-    def _setup_log_files(self):
-        """Inizializza i file di log, sovrascrivendo quelli esistenti."""
+    def _setup_log_files(self, log_options):
+        """Inizializza i file di log in una nuova cartella per questa esecuzione (le precedenti restano)."""
+        names = {i: f"terminal_{i+1}_{title.replace(' ', '_')}" for i, title in enumerate(self.terminal_titles)}
+        log_options.setdefault('on_error', lambda msg: self.write_to_terminal(4, msg))
+        self.log_sink = LogSink(self.log_dir, names, **log_options)
+        self.log_files = self.log_sink.paths
         for i, title in enumerate(self.terminal_titles):
-            filename = f"terminal_{i+1}_{title.replace(' ', '_')}.log"
-            filepath = self.log_dir / filename
-            # Sovrascrive il file se esiste
-            self.log_files[i] = open(filepath, 'w', encoding='utf-8')
-            self.file_locks[i] = threading.Lock()
-            # Scrivi header
-            self.log_files[i].write(f"=== {title} - Started: {datetime.now()} ===\n\n")
-            self.log_files[i].flush()
+            self.log_sink.write(i, f"=== {title} - Started: {datetime.now()} ===\n\n")
 
     def _create_styled_button(self, parent, text, command = None, width=20, color_type='primary'):
         """Crea un pulsante stilizzato."""
@@ -421,79 +431,97 @@ class MultiTerminalGUI:
             txt = f"+- {text} -+"
             self.queues[terminal_id].put(txt)
     
-    def _update_terminals(self):
-        """Thread che aggiorna continuamente i terminali dalla coda."""
-        while self.running:
-            for terminal_id in range(6):
-                try:
-                    # Controlla se ci sono messaggi nella coda
-                    if not self.queues[terminal_id].empty():
-                        # Raccogli tutti i messaggi disponibili (batch processing)
-                        messages = []
-                        while not self.queues[terminal_id].empty() and len(messages) < 10:
-                            try:
-                                msg = self.queues[terminal_id].get_nowait()
-                                messages.append(msg)
-                            except queue.Empty:
-                                break
-                        
-                        if messages:
-                            combined_text = '\n'.join(messages) + '\n'
-                            
-                            # Aggiorna GUI
-                            self.root.after(0, self._update_terminal_widget, terminal_id, combined_text)
-                            
-                            # Flash indicatore attività
-                            self._flash_indicator(terminal_id)
-                            
-                            # Salva su file
-                            self._write_to_log(terminal_id, combined_text)
-                
-                except Exception as e:
-                    print(f"Error updating terminal {terminal_id}: {e}")
-            
-            # Breve pausa per non sovraccaricare CPU
-            time.sleep(0.01)
-    
-    def _flash_indicator(self, terminal_id):
-        """Fa lampeggiare l'indicatore di attività."""
-        def flash():
+    def ask_confirmation(self, title, message, on_answer):
+        """
+        Metodo thread-safe per chiedere una conferma all'operatore con una finestra sì/no.
+        La finestra viene aperta nel thread della GUI, il chiamante non si blocca.
+
+        Args:
+            title: Titolo della finestra
+            message: Testo della domanda
+            on_answer: Funzione chiamata con True/False alla risposta (nel thread della GUI)
+        """
+        def _ask():
+            on_answer(messagebox.askyesno(title, message, parent=self.root))
+        self.root.after(0, _ask)
+
+    def _render_terminals(self):
+        """
+        Ciclo di rendering eseguito nel thread della GUI con un solo after() periodico:
+        svuota tutte le code, unisce i messaggi arrivati nell'intervallo in un solo inserimento
+        per terminale e aggiorna gli indicatori di attività.
+        """
+        if not self.running:
+            return
+        now = time.monotonic()
+        for terminal_id, q in self.queues.items():
             try:
-                indicator = self.terminals[terminal_id]['indicator']
-                indicator.config(fg='#ffffff')
-                self.root.after(100, lambda: indicator.config(fg='#90ee90'))
-            except:
-                pass
-        self.root.after(0, flash)
-    
+                # Tutto ciò che è in coda ora (i messaggi che arrivano durante lo svuotamento vanno al prossimo giro)
+                messages = []
+                for _ in range(q.qsize()):
+                    try:
+                        messages.append(q.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if messages:
+                    combined_text = '\n'.join(messages) + '\n'
+                    self._update_terminal_widget(terminal_id, combined_text)
+                    self._flash_indicator(terminal_id, now)
+                    self._write_to_log(terminal_id, combined_text)
+                elif terminal_id in self._flash_until and now >= self._flash_until[terminal_id]:
+                    del self._flash_until[terminal_id]
+                    self.terminals[terminal_id]['indicator'].config(fg='#90ee90')
+            except Exception as e:
+                print(f"Error updating terminal {terminal_id}: {e}")
+
+        self.root.after(self.render_interval, self._render_terminals)
+
+    def _flash_indicator(self, terminal_id, now):
+        """Fa lampeggiare l'indicatore di attività (lo spegne il ciclo di rendering)."""
+        if terminal_id not in self._flash_until:
+            self.terminals[terminal_id]['indicator'].config(fg='#ffffff')
+        self._flash_until[terminal_id] = now + FLASH_DURATION
+
     def _update_terminal_widget(self, terminal_id, text):
         """Aggiorna il widget del terminale nel thread principale."""
         try:
             widget = self.terminals[terminal_id]['widget']
+            # Di un blocco più lungo dello scrollback serve solo la coda
+            max_lines = self.scrollback[terminal_id]
+            if text.count('\n') > max_lines:
+                text = '\n'.join(text.split('\n')[-max_lines - 1:])
             widget.config(state=tk.NORMAL)
             widget.insert(tk.END, text)
             # Auto-scroll
             widget.see(tk.END)
             widget.config(state=tk.DISABLED)
             
-            # Limita linee visualizzate per performance (mantieni ultime 1000)
-            lines = widget.get("1.0", tk.END).split('\n')
-            if len(lines) > 1000:
+            # Limita le linee visualizzate: il numero di linee si legge dall'indice di fine (senza copiare il testo)
+            # e si taglia a blocchi, così la delete non avviene a ogni aggiornamento
+            max_lines = self.scrollback[terminal_id]
+            lines = int(widget.index('end-1c').split('.')[0])
+            if lines > max_lines + int(max_lines * SCROLLBACK_TRIM_FRACTION):
                 widget.config(state=tk.NORMAL)
-                widget.delete("1.0", f"{len(lines)-1000}.0")
+                widget.delete("1.0", f"{lines - max_lines + 1}.0")
                 widget.config(state=tk.DISABLED)
         except Exception as e:
             print(f"Error updating widget {terminal_id}: {e}")
     
     def _write_to_log(self, terminal_id, text):
-        """Scrive il testo nel file di log corrispondente."""
-        with self.file_locks[terminal_id]:
-            try:
-                self.log_files[terminal_id].write(text)
-                self.log_files[terminal_id].flush()
-            except Exception as e:
-                print(f"Error writing to log {terminal_id}: {e}")
+        """Accoda il testo per il file di log corrispondente (la scrittura avviene nel thread del LogSink)."""
+        self.log_sink.write(terminal_id, text)
     
+    def set_scrollback(self, terminal_id, lines):
+        """
+        Imposta il numero di linee mantenute in un terminale.
+
+        Args:
+            terminal_id: ID del terminale (0-5)
+            lines: Numero di linee da mantenere
+        """
+        self.scrollback[terminal_id] = max(1, int(lines))
+
     def add_control(self, widget):
         """
         Metodo per aggiungere controlli personalizzati alla colonna extra.
@@ -507,12 +535,11 @@ class MultiTerminalGUI:
         """Chiude i file di log e pulisce le risorse."""
         self.running = False
         
-        # Chiudi tutti i file di log
-        for file in self.log_files.values():
-            try:
-                file.close()
-            except:
-                pass
+        # Scrivi i log in coda e chiudi i file
+        try:
+            self.log_sink.close()
+        except Exception:
+            pass
         
         # Aggiorna status
         if hasattr(self, 'status_label'):
@@ -4,190 +4,166 @@ import time
 import threading
 from typing import Tuple, List
 
+import numpy as np
+
 from pose_class import Pose
 from camera_handler_class import CameraHandler
 from robot_controller_class import RobotController
 from multi_terminal_gui_class import MultiTerminalGUI
+from capture_pipeline import CapturePipeline, CaptureSession
+from telemetry_buffer import TelemetryRingBuffer
+from viewpoint_planner import plan_viewpoints, joint_travel, top_viewpoint
 
 global zed
 zed: CameraHandler = CameraHandler()
+capture = CapturePipeline(zed)
 
+CAPTURE_TIMEOUT = 120.0     # s, attesa massima della fine registrazione dopo il movimento
 
-def start_scanning(pose: Pose, gui: MultiTerminalGUI, plant_name: str, frames_to_record: int = 300):
-    """Avvia la scansione in background."""
-    global zed
-    try:
-        zed.record_cam(pose, gui, plant_name, frames_to_record)
-    except Exception as e:
-        gui.write_to_terminal(4, f"Errore durante la registrazione: {e}")
 
-def scan_plant(bbox, plant_name: str, dobot: RobotController, gui: MultiTerminalGUI, frames_to_record: int = 300):
+def start_scanning(pose: Pose, gui: MultiTerminalGUI, plant_name: str, frames_to_record: int = 300,
+                   telemetry: TelemetryRingBuffer | None = None) -> CaptureSession:
+    """Avvia la scansione nel worker di registrazione e restituisce la sessione su cui attendere."""
+    return capture.start(pose, gui, plant_name, frames_to_record, telemetry)
+
+# Posizioni di visione alta da cui parte la registrazione (braccio rivolto verso -y e verso +y)
+HIGH_VISION_JOINTS = [
+    [-105.0000, -46.0000, 86.0000, 29.0000, -90.0000, 168.0000],
+    [103.0000, 39.0000, -86.0000, -24.0000, 88.0000, 195.0000],
+]
+
+def high_vision_joints(top_joints) -> np.ndarray:
+    """
+    Posizione di visione alta da cui parte (e a cui torna) la scansione di ogni piantina: quella più
+    vicina nello spazio dei giunti alla vista dall'alto. top_joints (6,) o (N, 6) -> (6,) o (N, 6).
     """
-    Esegue la scansione completa della piantina muovendosi nei quattro punti.
+    top = np.asarray(top_joints, dtype=float)
+    high = np.asarray(HIGH_VISION_JOINTS, dtype=float)
+    chosen = high[joint_travel(np.atleast_2d(top), high).argmin(axis=1)]
+    return chosen if top.ndim == 2 else chosen[0]
+
+def scan_plant(bbox, plant_name: str, dobot: RobotController, gui: MultiTerminalGUI, frames_to_record: int = 300,
+               n_views: int = 4, return_to_top: bool = True):
+    """
+    Esegue la scansione completa della piantina: vista dall'alto più n_views viste laterali disposte attorno
+    alla piantina, in qualunque posizione del banco.
     
     Args:
         bbox: bounding box rigorosamente di tipo YOLO absolute (x_centro, y_centro, z_centro, larghezza, profondità, altezza con valori assoluti), altrimenti non funziona
-        center_x, center_y, center_z: Coordinate del centro della piantina
-        distance: Distanza dal centro per i punti di scansione
+        plant_name: Nome della piantina, usato per il file della point cloud
+        frames_to_record: Numero di frame da registrare
+        n_views: Numero di viste laterali (meno viste, scansione più rapida)
+        return_to_top: Se True torna alla vista dall'alto tra una vista laterale e la successiva
+
+    Returns:
+        True se la traiettoria è stata eseguita e la registrazione si è conclusa senza errori
     """
     
     if bbox is None:
         gui.write_to_terminal(1, "Percorsi - Il bounding box è None.")
-        return
+        return False
     
     if bbox[2] < 0:   #Il braccio sarebbe sotto il piano di lavoro
         gui.write_to_terminal(1, "Percorsi - Coordinata Z della piantina non valida, valore negativo.")
-        return
+        return False
     
-    if not dobot.position_reachable([bbox[0], bbox[1], bbox[5], -180.0000, 0.0000, 90.0000]):
+    # Calcola e verifica tutti i punti di scansione prima di muovere il braccio
+    plan = plan_viewpoints(bbox, n_views, seed=dobot.current_joints(), solver=dobot.kinematics,
+                           return_to_top=return_to_top)
+    for azimuth, reasons in plan.skipped:
+        gui.write_to_terminal(1, f"Percorsi - Vista a {azimuth:.0f}° scartata: {', '.join(reasons)}.")
+    if len(plan.waypoints) < 2:
         gui.write_to_terminal(1, "Percorsi - Posizione della piantina non raggiungibile.")
-        return
-    
-    if bbox[0] == 0 or bbox[1] == 0:   #Siamo su uno degli assi
-        gui.write_to_terminal(1, "Percorsi - Posizione della piantina non valida, si trova su uno degli assi.")
-        return
-
-    if bbox[0] > 0 and bbox[1] > 0:   #Primo quadrante
-        movement_first_quadrant(bbox, plant_name, dobot, gui, frames_to_record)
-        return
+        return False
 
-    if bbox[0] < 0 and bbox[1] > 0:   #Secondo quadrante
-        movement_second_quadrant(bbox, plant_name, dobot, gui, frames_to_record)
-        return
-
-    if bbox[0] < 0 and bbox[1] < 0:   #Terzo quadrante
-        gui.write_to_terminal(1, "Percorsi - Posizione della piantina nel terzo quadrante, movimenti non ancora implementati.")
-        return
-
-    if bbox[0] > 0 and bbox[1] < 0:   #Quarto quadrante
-        gui.write_to_terminal(1, "Percorsi - Posizione della piantina nel quarto quadrante, movimenti non ancora implementati.")
-        return
-
-def movement_first_quadrant(bbox, plant_name: str, dobot: RobotController, gui: MultiTerminalGUI, frames_to_record: int = 300):
-    """
-    Esegue il movimento del braccio per la scansione della piantina nel primo quadrante.
-    
-    Args:
-        bbox: bounding box rigorosamente di tipo YOLO absolute (x_centro, y_centro, z_centro, larghezza, profondità, altezza con valori assoluti), altrimenti non funziona
-        center_x, center_y, center_z: Coordinate del centro della piantina
-        distance: Distanza dal centro per i punti di scansione
-    """
-    
-    print("Percorsi - Movimento nel primo quadrante.")
-    
-    center_z_max = [bbox[0], bbox[1], bbox[2]+bbox[5]/2]   #Prendo z max
-
-    coord_top_vision_plant = [center_z_max[0], center_z_max[1], center_z_max[2]+350.0, -180.0000, 0.0000, 180.0000]
-    
-    # arriva al punto iniziale di scansione generale
-    start_joints = [-105.0000, -46.0000, 86.0000, 29.0000, -90.0000, 168.0000]
+    # arriva al punto iniziale di scansione generale, scegliendo la configurazione più vicina alla vista dall'alto
+    start_joints = high_vision_joints(plan.joints[0]).tolist()
     dobot.run_point(start_joints)
     
-    # Avvia la scansione in background
+    # Avvia la scansione in background, i frame vengono associati alle pose del feedback
     pose = Pose.crea_pose_from_coord(dobot.get_current_pose())
-    threading.Thread(target=start_scanning, args=(pose, gui, plant_name, frames_to_record), daemon=True).start()
+    session = start_scanning(pose, gui, plant_name, frames_to_record, dobot.telemetry)
     
-    # reach the top vision of the plant
-    gui.write_to_terminal(1, "Pronto per raggiungere top.")
-    dobot.raggiungi_punto(coord_top_vision_plant)
-    print("alto fatto")
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-
-    # move to first scanning point
-    coord_right_vision_plant = [center_z_max[0], center_z_max[1]+240.0, center_z_max[2]+285.0, -141.0000, 0.0000, 180.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere fronte.")
-    dobot.raggiungi_punto(coord_right_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("fronte fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to second scanning point
-    coord_front_vision_plant = [center_z_max[0]+214.0, center_z_max[1], center_z_max[2]+305.0, -151.0000, 0.0000, 90.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere destra.")
-    dobot.raggiungi_punto(coord_front_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("destra fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to third scanning point
-    coord_left_vision_plant = [center_z_max[0], center_z_max[1]-246.0, center_z_max[2]+285.0, -141.0000, 0.0000, 0.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere dietro.")
-    dobot.raggiungi_punto(coord_left_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("dietro fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to fourth scanning point
-    coord_back_vision_plant = [center_z_max[0]-243.0, center_z_max[1], center_z_max[2]+285.0, -141.0000, 0.0000, -90.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere sinistra.")
-    dobot.raggiungi_punto(coord_back_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("sinistra fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
+    gui.write_to_terminal(1, f"Pronto per eseguire la traiettoria di scansione ({len(plan.waypoints)} punti).")
+    session.motion_started()
+    try:
+        moved = dobot.run_trajectory(plan.waypoints.tolist())
+    except Exception:
+        session.cancel()
+        raise
+    finally:
+        session.motion_finished()
+    if not moved:
+        # Registrazione senza movimento: inutile attenderla
+        session.cancel()
+        gui.write_to_terminal(4, f"Percorsi - Traiettoria di scansione di {plant_name} non eseguita, scansione annullata.")
+        dobot.run_point(start_joints)
+        return False
 
     # return to ambient high vision point
     dobot.run_point(start_joints)
 
+    # La piantina successiva parte solo quando la registrazione di questa è conclusa
+    try:
+        if not session.wait(CAPTURE_TIMEOUT):
+            gui.write_to_terminal(4, f"Percorsi - Registrazione di {plant_name} non conclusa entro {CAPTURE_TIMEOUT:g} secondi.")
+            return False
+    except Exception as e:
+        gui.write_to_terminal(4, f"Percorsi - Registrazione di {plant_name} fallita: {e}")
+        return False
+    return True
+
 
-def movement_second_quadrant(bbox, plant_name: str, dobot: RobotController, gui: MultiTerminalGUI, frames_to_record: int = 300):
+def order_plants(list_of_plants, dobot: RobotController) -> Tuple[List[int], List[int]]:
     """
-    Esegue il movimento del braccio per la scansione della piantina nel primo quadrante.
-    
+    Ordina le piantine per minimizzare gli spostamenti del braccio tra una scansione e l'altra.
+    Ogni scansione parte e finisce nella posizione di visione alta della propria configurazione
+    (high_vision_joints), quindi l'unico tratto che dipende dall'ordine è il cambio di configurazione:
+    le piantine sono raggruppate per configurazione, a partire da quella più vicina alla posizione attuale,
+    mantenendo l'ordine originale all'interno di ogni gruppo.
+
     Args:
-        bbox: bounding box rigorosamente di tipo YOLO absolute (x_centro, y_centro, z_centro, larghezza, profondità, altezza con valori assoluti), altrimenti non funziona
-        center_x, center_y, center_z: Coordinate del centro della piantina
-        distance: Distanza dal centro per i punti di scansione
-    """
-    print("Percorsi - Movimento nel secondo quadrante.")
-    center_z_max = [bbox[0], bbox[1], bbox[2]+bbox[5]/2]   #Prendo z max
+        list_of_plants: array (N, 6) o lista di bounding box YOLO absolute, come restituita da find_plant
 
-    coord_top_vision_plant = [center_z_max[0], center_z_max[1], center_z_max[2]+350.0, -180.0000, 0.0000, 180.0000]
+    Returns:
+        (ordine di scansione, indici delle piantine non raggiungibili)
+    """
+    if list_of_plants is None or len(list_of_plants) == 0:
+        return [], []
+    tops = top_viewpoint(np.asarray(list_of_plants, dtype=float).reshape(-1, 6))
+    check = dobot.check_poses(tops)
+    reachable = np.flatnonzero(check.ok)
+    high = np.asarray(HIGH_VISION_JOINTS, dtype=float)
+    config = joint_travel(check.joints[reachable].reshape(-1, 6), high).argmin(axis=1)
+    current = dobot.current_joints()
+    start = np.asarray(current, dtype=float) if current is not None else high[config[0] if len(config) else 0]
+    # Ordinamento stabile per distanza della configurazione dalla posizione attuale: un solo cambio di configurazione
+    order = reachable[np.argsort(joint_travel(start[None], high)[0][config], kind='stable')]
+    return order.tolist(), np.flatnonzero(~check.ok).tolist()
+
+def scan_plants(list_of_plants, dobot: RobotController, gui: MultiTerminalGUI, frames_to_record: int = 300,
+                n_views: int = 4):
+    """
+    Scansiona tutte le piantine in un'unica esecuzione, nell'ordine che minimizza gli spostamenti.
+    Tra una piantina e la successiva il braccio passa per la posizione di visione alta condivisa,
+    da cui parte anche la scansione seguente.
 
-    # arriva al punto iniziale di scansione generale
-    start_joints = [103.0000, 39.0000, -86.0000, -24.0000, 88.0000, 195.0000]
-    dobot.run_point(start_joints)
-    
-    # Avvia la scansione in background
-    pose = Pose.crea_pose_from_coord(dobot.get_current_pose())
-    threading.Thread(target=start_scanning, args=(pose, gui, plant_name, frames_to_record), daemon=True).start()
-    
-    # reach the top vision of the plant
-    gui.write_to_terminal(1, "Pronto per raggiungere top.")
-    dobot.raggiungi_punto(coord_top_vision_plant)
-    print("alto fatto")
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-
-    # move to first scanning point
-    coord_right_vision_plant = [center_z_max[0], center_z_max[1]+240.0, center_z_max[2]+285.0, -141.0000, 0.0000, 180.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere fronte.")
-    dobot.raggiungi_punto(coord_right_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("fronte fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to second scanning point
-    coord_front_vision_plant = [center_z_max[0]+214.0, center_z_max[1], center_z_max[2]+305.0, -151.0000, 0.0000, 90.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere destra.")
-    dobot.raggiungi_punto(coord_front_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("destra fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to third scanning point
-    coord_left_vision_plant = [center_z_max[0], center_z_max[1]-246.0, center_z_max[2]+285.0, -141.0000, 0.0000, 0.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere dietro.")
-    dobot.raggiungi_punto(coord_left_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("dietro fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
-
-    # move to fourth scanning point
-    coord_back_vision_plant = [center_z_max[0]-243.0, center_z_max[1], center_z_max[2]+285.0, -141.0000, 0.0000, -90.0000]
-    gui.write_to_terminal(1, "Pronto per raggiungere sinistra.")
-    dobot.raggiungi_punto(coord_back_vision_plant)
-    time.sleep(0.1)  # Attendi un secondo per permettere la scansione
-    print("sinistra fatto")
-    dobot.raggiungi_punto(coord_top_vision_plant) #return to top vision point
+    Args:
+        list_of_plants: array (N, 6) o lista di bounding box YOLO absolute, come restituita da find_plant
 
-    # return to ambient high vision point
-    dobot.run_point(start_joints)
+    Returns:
+        indici delle piantine non scansionate (non raggiungibili o con scansione fallita)
+    """
+    order, unreachable = order_plants(list_of_plants, dobot)
+    for idx in unreachable:
+        gui.write_to_terminal(1, f"Percorsi - Pianta {idx+1} non raggiungibile, esclusa dalla scansione.")
+    gui.write_to_terminal(1, f"Percorsi - Ordine di scansione: {[i+1 for i in order]}")
+
+    failed = []
+    for idx in order:
+        gui.write_to_terminal(0, f"Percorsi - Scansione pianta {idx+1}.")
+        if not scan_plant(list_of_plants[idx], f"plant_{idx+1}", dobot, gui, frames_to_record, n_views=n_views):
+            failed.append(idx)
+    if failed:
+        gui.write_to_terminal(4, f"Percorsi - Scansione non riuscita per le piante {[i+1 for i in failed]}.")
+    return sorted(unreachable + failed)
@@ -0,0 +1,99 @@
+# plant_detection.py
+
+import copy
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from artifact_writer import ArtifactWriter
+from crop_sensing import find_plant
+
+DETECTION_SCALE = 4         # the coarse detection runs at 1/DETECTION_SCALE of the ZED resolution
+ROI_MARGIN = 2              # coarse pixels added around each candidate before the full-resolution refinement
+
+
+class Detection(NamedTuple):
+    """Result of detect_plants."""
+    labels: np.ndarray          # (H, W) int32 label map at full resolution, 0 = background, i + 1 = plant i
+    rois: np.ndarray            # (N, 4) full-resolution ROIs [row_start, row_end, col_start, col_end]
+    bounding_boxes: list        # 2D boxes of segment_plants scaled to full resolution (for the debug image)
+
+
+def downscale(image: np.ndarray, scale: int) -> np.ndarray:
+    """Decimate an image by an integer factor (nearest pixel, no copy until used)."""
+    return image[::scale, ::scale]
+
+
+def dilate(mask: np.ndarray, iterations: int = 1) -> np.ndarray:
+    """3x3 binary dilation with NumPy shifts."""
+    out = mask.astype(bool)
+    for _ in range(iterations):
+        grown = out.copy()
+        grown[1:, :] |= out[:-1, :]
+        grown[:-1, :] |= out[1:, :]
+        grown[:, 1:] |= out[:, :-1]
+        grown[:, :-1] |= out[:, 1:]
+        out = grown
+    return out
+
+
+def _roi(mask: np.ndarray, scale: int, margin: int, shape) -> Optional[np.ndarray]:
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return None
+    r0 = max(rows[0] - margin, 0) * scale
+    r1 = min((rows[-1] + 1 + margin) * scale, shape[0])
+    c0 = max(cols[0] - margin, 0) * scale
+    c1 = min((cols[-1] + 1 + margin) * scale, shape[1])
+    return np.array([r0, r1, c0, c1])
+
+
+def detect_plants(image: np.ndarray, plants_number: int, scale: int = DETECTION_SCALE,
+                  margin: int = ROI_MARGIN) -> Detection:
+    """
+    Fast plant detection: filter and segment the image at 1/scale resolution, then refine each plant
+    at full resolution only inside its ROI. The full-resolution filter result is kept where it falls
+    inside the dilated coarse mask of the plant, so neighbouring plants in the same ROI stay separate.
+
+    Args:
+        image: full-resolution ZED image (H, W, C).
+        plants_number: number of plants to segment.
+        scale: decimation factor of the coarse pass (1 = full resolution only).
+        margin: coarse pixels added around each plant ROI.
+    """
+    shape = image.shape[:2]
+    small = downscale(image, scale)
+    mask_small = find_plant.filter_plants(small, save_mask=False)
+    masks_small, boxes_small = find_plant.segment_plants(mask_small, plants_number)
+
+    labels = np.zeros(shape, dtype=np.int32)
+    rois: List[np.ndarray] = []
+    for i, m in enumerate(masks_small):
+        m = np.asarray(m) > 0
+        roi = _roi(m, scale, margin, shape)
+        if roi is None:
+            rois.append(np.zeros(4, dtype=np.int64))
+            continue
+        r0, r1, c0, c1 = roi
+        # Coarse mask upsampled on the ROI, grown by one coarse pixel to recover the plant edges
+        # (r0 and c0 are multiples of scale, r1 and c1 may be clipped to the image)
+        coarse = dilate(m)[r0 // scale:-(-r1 // scale), c0 // scale:-(-c1 // scale)]
+        coarse = np.repeat(np.repeat(coarse, scale, axis=0), scale, axis=1)[:r1 - r0, :c1 - c0]
+        fine = np.asarray(find_plant.filter_plants(image[r0:r1, c0:c1], save_mask=False)) > 0
+        labels[r0:r1, c0:c1][fine & coarse] = i + 1
+        rois.append(roi)
+
+    bounding_boxes = [(np.asarray(b) * scale).tolist() for b in boxes_small]
+    return Detection(labels, np.array(rois).reshape(-1, 4), bounding_boxes)
+
+
+def save_debug_images(image: np.ndarray, detection: Detection, writer: ArtifactWriter) -> bool:
+    """
+    Queue the debug images of a detection (filter mask and clustered image) on the artifact writer,
+    so the PNG encoding stays out of the detection latency. The image and the boxes are copied,
+    so a later grab into the same buffer does not change them. Returns False if any was dropped.
+    """
+    ok = writer.submit("filter", detection.labels > 0)
+    return writer.submit_call(find_plant.save_clustered_image, np.array(image, copy=True),
+                              copy.deepcopy(detection.bounding_boxes)) and ok
@@ -0,0 +1,221 @@
+# ply_io.py
+
+import os
+from itertools import islice
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# PLY scalar types and their little-endian NumPy equivalents (both naming styles are in use, the ZED SDK writes float32/uchar)
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': '<i2', 'int16': '<i2', 'ushort': '<u2', 'uint16': '<u2',
+    'int': '<i4', 'int32': '<i4', 'uint': '<u4', 'uint32': '<u4',
+    'float': '<f4', 'float32': '<f4', 'double': '<f8', 'float64': '<f8',
+}
+_PLY_NAMES = {'i1': 'char', 'u1': 'uchar', 'i2': 'short', 'u2': 'ushort', 'i4': 'int', 'u4': 'uint',
+              'f4': 'float', 'f8': 'double'}
+
+# Point cloud layout of the plant scans: xyz, normals and RGB
+PlantVertexType = np.dtype([
+    ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+    ('nx', '<f4'), ('ny', '<f4'), ('nz', '<f4'),
+    ('red', 'u1'), ('green', 'u1'), ('blue', 'u1'),
+])
+
+CHUNK_VERTICES = 65536          # vertices per chunk when converting or streaming
+_COUNT_WIDTH = 12               # the vertex count is padded so it can be patched when the writer closes
+
+
+class PlyHeader(NamedTuple):
+    format: str                 # 'ascii', 'binary_little_endian' or 'binary_big_endian'
+    vertex_count: int
+    dtype: np.dtype             # vertex record layout
+    header_size: int            # bytes before the first vertex
+    other_elements: list        # names of the elements after the vertices (faces, ...)
+
+
+def read_header(path: str) -> PlyHeader:
+    """Parse the header of a PLY file; only the vertex element needs to have scalar properties."""
+    fmt, count, fields, others = None, 0, [], []
+    element = None
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"{path} non è un file PLY")
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path}: header PLY senza end_header")
+            words = line.decode('ascii').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                header_size = f.tell()
+                break
+            if words[0] == 'format':
+                fmt = words[1]
+            elif words[0] == 'element':
+                element = words[1]
+                if element == 'vertex':
+                    count = int(words[2])
+                else:
+                    others.append(element)
+            elif words[0] == 'property' and element == 'vertex':
+                if words[1] == 'list':
+                    raise ValueError(f"{path}: proprietà lista nei vertici non supportata")
+                fields.append((words[2], PLY_TYPES[words[1]]))
+    if fmt is None:
+        raise ValueError(f"{path}: formato PLY mancante")
+    dtype = np.dtype(fields)
+    if fmt == 'binary_big_endian':
+        dtype = dtype.newbyteorder('>')
+    return PlyHeader(fmt, count, dtype, header_size, others)
+
+
+def _header_bytes(dtype: np.dtype, count: int, comments=()) -> bytes:
+    lines = ['ply', 'format binary_little_endian 1.0']
+    lines += [f'comment {c}' for c in comments]
+    lines.append(f'element vertex {count:0{_COUNT_WIDTH}d}')
+    for name in dtype.names:
+        lines.append(f'property {_PLY_NAMES[dtype[name].str[1:]]} {name}')
+    lines.append('end_header')
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+class PlyWriter:
+    """
+    Streaming writer of binary little-endian PLY point clouds: vertices are appended in chunks
+    as they are produced and the vertex count in the header is patched on close().
+
+        with PlyWriter(path) as ply:
+            for points in frames:
+                ply.append(points)
+    """
+
+    def __init__(self, path: str, dtype: np.dtype = PlantVertexType, comments=()):
+        self.path = path
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.count = 0
+        self._file = open(path, 'wb')
+        header = _header_bytes(self.dtype, 0, comments)
+        self._count_offset = header.index(b'element vertex ') + len(b'element vertex ')
+        self._file.write(header)
+
+    def append(self, vertices) -> int:
+        """
+        Append a chunk of vertices: a structured array (fields matched by name) or a plain
+        (N, k) array with the columns in the order of the dtype. Returns the total count.
+        """
+        vertices = np.asarray(vertices)
+        if vertices.dtype.names is None:
+            plain = np.atleast_2d(vertices)
+            chunk = np.empty(len(plain), dtype=self.dtype)
+            for i, name in enumerate(self.dtype.names):
+                chunk[name] = plain[:, i]
+        elif vertices.dtype != self.dtype:
+            chunk = np.empty(len(vertices), dtype=self.dtype)
+            for name in self.dtype.names:
+                chunk[name] = vertices[name]
+        else:
+            chunk = vertices
+        self._file.write(np.ascontiguousarray(chunk).tobytes())
+        self.count += len(chunk)
+        return self.count
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(self._count_offset)
+        self._file.write(f'{self.count:0{_COUNT_WIDTH}d}'.encode('ascii'))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_ply(path: str, vertices: np.ndarray, comments=()):
+    """Write a structured vertex array as binary little-endian PLY in one call."""
+    vertices = np.asarray(vertices)
+    with PlyWriter(path, vertices.dtype, comments) as ply:
+        ply.append(vertices)
+
+
+def read_ply(path: str, mmap: bool = True) -> np.ndarray:
+    """
+    Read the vertices of a PLY file into a structured array.
+    Binary files are memory-mapped (read-only, no parsing, pages loaded on access) unless mmap is False;
+    ASCII files are parsed, use ascii_to_binary once to make later reads instant.
+    """
+    header = read_header(path)
+    if header.format == 'ascii':
+        with open(path, 'rb') as f:
+            f.seek(header.header_size)
+            return _parse_ascii(f, header.dtype, header.vertex_count)
+    if mmap:
+        return np.memmap(path, dtype=header.dtype, mode='r', offset=header.header_size, shape=(header.vertex_count,))
+    with open(path, 'rb') as f:
+        f.seek(header.header_size)
+        return np.fromfile(f, dtype=header.dtype, count=header.vertex_count)
+
+
+def _parse_ascii(f, dtype: np.dtype, count: int) -> np.ndarray:
+    out = np.empty(count, dtype=dtype)
+    done = 0
+    for chunk in _ascii_chunks(f, dtype, count):
+        out[done:done + len(chunk)] = chunk
+        done += len(chunk)
+    return out
+
+
+def _ascii_chunks(f, dtype: np.dtype, count: int, chunk_vertices: int = CHUNK_VERTICES):
+    """Yield the ASCII vertices as structured arrays of at most chunk_vertices rows."""
+    remaining = count
+    while remaining > 0:
+        lines = list(islice(f, min(chunk_vertices, remaining)))
+        if not lines:
+            raise ValueError(f"File PLY troncato: mancano {remaining} vertici")
+        values = np.array(b' '.join(lines).split(), dtype=np.float64).reshape(len(lines), -1)
+        chunk = np.empty(len(lines), dtype=dtype)
+        for i, name in enumerate(dtype.names):
+            chunk[name] = values[:, i]
+        remaining -= len(lines)
+        yield chunk
+
+
+def ascii_to_binary(path: str, out_path: Optional[str] = None, chunk_vertices: int = CHUNK_VERTICES) -> str:
+    """
+    Convert an ASCII PLY point cloud to binary little-endian, streaming chunk by chunk.
+    Without out_path the file is replaced in place (through a temporary file, so a failure leaves the original).
+    Binary files are left untouched. Returns the path of the binary file.
+    """
+    header = read_header(path)
+    if header.format != 'ascii':
+        return path if out_path is None else _copy(path, out_path)
+    if header.other_elements:
+        raise ValueError(f"{path}: conversione supportata solo per nuvole di punti (trovati {header.other_elements})")
+
+    target = out_path if out_path is not None else path
+    tmp_path = target + '.tmp'
+    try:
+        with open(path, 'rb') as f, PlyWriter(tmp_path, header.dtype.newbyteorder('<')) as ply:
+            f.seek(header.header_size)
+            for chunk in _ascii_chunks(f, header.dtype, header.vertex_count, chunk_vertices):
+                ply.append(chunk)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+def _copy(path: str, out_path: str) -> str:
+    with open(path, 'rb') as src, open(out_path, 'wb') as dst:
+        while True:
+            block = src.read(1 << 20)
+            if not block:
+                break
+            dst.write(block)
+    return out_path
@@ -1,7 +1,6 @@
 # Wait for the robot to reach the target positions (with some tolerance)# robot_controller.py
 
 import re
-import time
 
 import sys
 import os
@@ -14,6 +13,11 @@ sys.path.append(BASE_PATH)
 
 from dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, DobotApiFeedBack
 from multi_terminal_gui_class import MultiTerminalGUI
+from feed_thread import FeedbackReader
+from telemetry_buffer import TelemetryRingBuffer
+from telemetry_log import TelemetryLog
+from kinematics import KinematicsSolver
+from workspace import WorkspaceCheck, check_poses
 
 # Default IP and ports for the Dobot robot
 IP_DOBOT = "192.168.5.1"
@@ -21,18 +25,42 @@ DASHBOARD_PORT = 29999
 MOVE_PORT = 30003
 FEED_PORT = 30005
 
+# Robot modes reported in the feedback packet (robot_mode field)
+ROBOT_MODE_ENABLE = 5       # enabled and idle
+ROBOT_MODE_RUNNING = 7      # executing a motion
+ROBOT_MODE_ERROR = 9
+
+JOINT_TOLERANCE = 1.0       # deg, max error per joint to consider the target reached
+MOTION_TIMEOUT = 10.0       # s, max wait for a single motion
+TRAJECTORY_CP_RATIO = 50    # continuous path blending ratio (1-100) used between waypoints
+POINT_CP_RATIO = 1          # lowest ratio accepted by CP(), restored after a trajectory for single point moves
+
+def reply_ok(reply: str | None) -> bool:
+    """True if a dashboard/move reply reports ErrorID 0, e.g. "0,{},CP(50);"."""
+    code = re.match(r'\s*(-?\d+)', reply or "")
+    return code is not None and int(code.group(1)) == 0
+
 class RobotController:
-    def __init__(self, gui: MultiTerminalGUI, ip: str = IP_DOBOT):
+    def __init__(self, gui: MultiTerminalGUI, ip: str = IP_DOBOT, telemetry_log_dir: str | None = None):
+        """
+        telemetry_log_dir: if given, every feedback packet is also written to a binary
+        telemetry log (telemetry_log.TelemetryLog) in this directory, for offline analysis.
+        """
         self.gui : MultiTerminalGUI = gui
         self.ip : str = ip
         self.connected : bool = False
+        self.kinematics = KinematicsSolver()    # local IK with pose cache
 
         try:
             print("Sto stabilendo la connessione con il robot...")
             self.dashboard = DobotApiDashboard(self.ip, DASHBOARD_PORT, self.gui)  # connection for info/control
             self.move = DobotApiMove(self.ip, MOVE_PORT, self.gui)              # connection for movement
             self.feed = DobotApi(self.ip, FEED_PORT, self.gui)                 # general API (unused in this context)
-            self.feedFour = DobotApiFeedBack(self.ip, FEED_PORT, self.gui)     # feedback (200ms) connection
+            self.feedFour = DobotApiFeedBack(self.ip, FEED_PORT, self.gui)     # feedback (8ms stream) connection
+            self.telemetry = TelemetryRingBuffer()                             # last 10 minutes of feedback packets
+            self.telemetry_log = TelemetryLog.for_run(telemetry_log_dir) if telemetry_log_dir else None
+            self.feedback = FeedbackReader(self.feedFour, self.gui, self.telemetry,
+                                           self.telemetry_log)  # latest-state snapshot, started by the caller
             self.gui.write_to_terminal(0, "Connessione al robot riuscita!")
         except Exception as e:
             msg = f"Connessione al robot fallita: {str(e)}"
@@ -41,51 +69,106 @@ class RobotController:
         
         self.connected = True
 
-    def run_point(self, target_joints: list):
+    def run_point(self, target_joints: list, timeout: float = MOTION_TIMEOUT):
         """
         Move the robot to the specified joint angles (target_joints list of 6 values).
         Blocks until the robot is within threshold of the target.
         """
         
-        # Move the robot to the target joint angles
+        # Move the robot to the target joint angles (packets up to this one predate the command)
+        since_seq = self.feedback_seq()
         self.move.JointMovJ(target_joints[0], target_joints[1], target_joints[2],
                            target_joints[3], target_joints[4], target_joints[5])
-        time.sleep(0.1) # short delay to initiate motion
 
         # Wait for the robot to reach the target positions (with some tolerance)
-        i = 0
-        while True:
-            i += 1
-            match = re.search(r'\{([^}]*)\}', self.dashboard.GetAngle())
-            if match:
-                values_str = match.group(1)
-                current_angles = [float(v.strip()) for v in values_str.split(',')]
-                # Check if all joints are within 1 degree of target
-                arrived = True
-                for idx in range(6):
-                    if abs(current_angles[idx] - target_joints[idx]) > 1.0:
-                        arrived = False
-                        break
-                if arrived:
-                    self.gui.write_to_terminal(1, "Controller - Target raggiunto!")
-                    return # target reached
-            # Delay to prevent busy-wait
-            time.sleep(0.5)
-            if i > 20:
-                self.gui.write_to_terminal(1, "Controller - Target non raggiunto entro 10 secondi")
-                return
+        if self.wait_motion_done(target_joints, timeout=timeout, since_seq=since_seq):
+            self.gui.write_to_terminal(1, "Controller - Target raggiunto!")
+        else:
+            self.gui.write_to_terminal(1, f"Controller - Target non raggiunto entro {timeout:g} secondi")
 
-    def ottieni_joint(self, coord):
+    def feedback_seq(self) -> int:
+        """Sequence number of the newest feedback packet (0 if none yet), to be taken before sending a motion."""
+        self.feedback.start()
+        latest = self.feedback.latest
+        return latest.seq if latest is not None else 0
+
+    def wait_motion_done(self, target_joints: list | None = None, timeout: float = MOTION_TIMEOUT,
+                         tolerance: float = JOINT_TOLERANCE, since_seq: int | None = None) -> bool:
+        """
+        Block until the motion queue is done, signalled by the feedback stream instead of polling the dashboard.
+        Only packets newer than since_seq are considered (default: the newest packet at the call; pass
+        feedback_seq() taken before sending the command). Like Sync(), the motion is done when the robot,
+        after being seen running (robot_mode 7 or running_status 1), is no longer running, so an idle packet
+        sent before the controller started the queued motion cannot end the wait. If target_joints is given,
+        q_actual must also be within tolerance of it, and an idle robot already on the target is accepted
+        even if it was never seen running (the controller may skip a motion of zero length).
+        Returns True if the motion completed within timeout seconds.
+        """
+        start_seq = self.feedback_seq() if since_seq is None else since_seq
+        target = np.asarray(target_joints, dtype=float) if target_joints is not None else None
+        started = False
+
+        def done(snapshot) -> bool:
+            nonlocal started
+            if snapshot.seq <= start_seq:
+                return False
+            if snapshot.robot_mode == ROBOT_MODE_RUNNING or snapshot.running_status:
+                started = True
+                return False
+            if target is None:
+                return started
+            return bool(np.all(np.abs(np.asarray(snapshot.q_actual) - target) <= tolerance))
+
+        return self.feedback.wait_for(done, timeout) is not None
+
+    def ottieni_joint(self, coord, validate: bool = False):
         """
         Compute joint angles for the given target Cartesian coordinates (x,y,z,rx,ry,rz).
         coord can be a list/tuple of 6 values or a string "{x, y, z, rx, ry, rz}".
+        The solution is computed locally (cached) choosing the configuration closest to the current joints;
+        the controller's InverseSolution is used only as fallback or, with validate=True, as a cross-check.
         Returns a list of 6 joint angles.
         """
 
         # Parse target coordinates
         point_coord = self._parse_target_coordinate(coord)
 
-        # Compute inverse kinematics
+        # Compute inverse kinematics locally, seeded with the current joints from the feedback
+        joints = self.kinematics.inverse(point_coord, seed=self.current_joints())[0]
+        if np.any(np.isnan(joints)):
+            self.gui.write_to_terminal(1, "Controller - Nessuna soluzione inversa locale, chiedo al controller.")
+            return self._ottieni_joint_controller(point_coord)
+
+        joint_angles = [float(v) for v in joints]
+        if validate:
+            controller_angles = self._ottieni_joint_controller(point_coord)
+            diff = np.max(np.abs(np.asarray(controller_angles) - joints))
+            if diff > JOINT_TOLERANCE:
+                self.gui.write_to_terminal(1, f"Controller - Soluzione locale diversa da quella del controller ({diff:.2f}°), uso quella del controller.")
+                return controller_angles
+
+        self.gui.write_to_terminal(1, f"Angoli calcolati: {joint_angles}")
+        return joint_angles
+
+    def ottieni_joint_batch(self, coords) -> np.ndarray:
+        """
+        Compute joint angles for a batch of Cartesian poses (N, 6) in one vectorised pass, without
+        any round trip to the controller. Each solution is the one closest to the current joints.
+        Returns an array (N, 6); rows of unreachable poses are NaN.
+        """
+        return self.kinematics.inverse(np.asarray(coords, dtype=float), seed=self.current_joints())
+
+    def current_joints(self) -> tuple | None:
+        """
+        Current joint angles from the latest feedback snapshot (no dashboard round trip), or None if no packet yet.
+        """
+        snapshot = self.feedback.latest
+        return snapshot.q_actual if snapshot is not None else None
+
+    def _ottieni_joint_controller(self, point_coord: list[float]) -> list[float]:
+        """
+        Ask the controller for the inverse solution (InverseSolution over the dashboard).
+        """
         sol = self.dashboard.InverseSolution(point_coord[0], point_coord[1], point_coord[2],
                                             point_coord[3], point_coord[4], point_coord[5], 0, 0)
         if sol.startswith('-'):
@@ -107,9 +190,7 @@ class RobotController:
             self.gui.write_to_terminal(1, "Controller - Soluzione inversa non valida")
             raise ValueError("Soluzione inversa non valida")
         values_str = match.group(1)
-        joint_angles = [float(v.strip()) for v in values_str.split(',')]
-        self.gui.write_to_terminal(1, f"Angoli calcolati: {joint_angles}")
-        return joint_angles 
+        return [float(v.strip()) for v in values_str.split(',')]
 
     def enable(self):
         """
@@ -154,6 +235,46 @@ class RobotController:
         joints = self.ottieni_joint(coord)
         self.run_point(joints)
 
+    def run_trajectory(self, waypoints: list, cp_ratio: int = TRAJECTORY_CP_RATIO) -> bool:
+        """
+        Move the robot through a list of Cartesian waypoints ([x, y, z, rx, ry, rz] each) without stopping.
+        All the MovJ commands are queued in a single pipelined batch on the move connection with CP blending,
+        the inverse kinematics is left to the controller and a single Sync() waits for the end of the path.
+        Returns False (without moving) if any waypoint is not reachable or CP is rejected, and False
+        if the controller rejects part of the batch or the Sync; CP is set back to POINT_CP_RATIO in any case.
+        """
+        points = [self._parse_target_coordinate(wp) for wp in waypoints]
+        if not points:
+            return True
+
+        check = self.check_poses(points)
+        if not check.ok.all():
+            for idx in check.rejected():
+                self.gui.write_to_terminal(1, f"Controller - Traiettoria annullata: punto {idx} non raggiungibile {points[idx]} ({', '.join(check.reasons[idx])})")
+            return False
+
+        if not reply_ok(self.dashboard.CP(cp_ratio)):
+            self.gui.write_to_terminal(4, f"Controller - Traiettoria annullata: CP({cp_ratio}) rifiutato dal controller.")
+            return False
+        completed = False
+        try:
+            with self.move.pipeline() as batch:
+                for point in points:
+                    self.move.MovJ(*point)
+            rejected = [idx for idx, reply in enumerate(batch.replies) if not reply_ok(reply)]
+            if rejected:
+                self.gui.write_to_terminal(4, f"Controller - Traiettoria interrotta: MovJ non accettato per i punti {rejected}.")
+            # Sync also waits for the MovJ queued before a rejected one
+            completed = reply_ok(self.move.Sync()) and not rejected
+        finally:
+            if not reply_ok(self.dashboard.CP(POINT_CP_RATIO)):    # near-exact stops for single point moves
+                self.gui.write_to_terminal(4, f"Controller - Ripristino di CP({POINT_CP_RATIO}) fallito, i movimenti successivi restano raccordati.")
+        if not completed:
+            self.gui.write_to_terminal(4, f"Controller - Traiettoria di {len(points)} punti non completata.")
+            return False
+        self.gui.write_to_terminal(1, f"Controller - Traiettoria di {len(points)} punti completata.")
+        return True
+
     def get_current_pose(self) -> list[float]:
         """
         Get the current Cartesian pose of the robot as a list of floats [x, y, z, rx, ry, rz].
@@ -172,6 +293,14 @@ class RobotController:
         point = np.power(point_coord[0], 2) + np.power(point_coord[1], 2) + np.power(point_coord[2], 2)
         return point <= np.power(900, 2)
 
+    def check_poses(self, coords) -> WorkspaceCheck:
+        """
+        Validate a batch of Cartesian poses (N, 6) in one vectorised pass against reach, table plane,
+        joint limits and singularity margins, using the current joints to pick the IK configuration.
+        Returns a WorkspaceCheck with per-pose ok flags, joint solutions and rejection reasons.
+        """
+        return check_poses(coords, seed=self.current_joints(), solver=self.kinematics)
+
     @staticmethod
     def _parse_target_coordinate(coord: list[float] | tuple[float] | str) -> list[float]:
         if isinstance(coord, str):
@@ -0,0 +1,135 @@
+# telemetry_buffer.py
+
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from dobot_api import MyType
+
+FEEDBACK_PERIOD = 0.008                             # the controller pushes a packet every 8 ms
+DEFAULT_HISTORY_SECONDS = 600                       # 10 minutes of feedback
+DEFAULT_CAPACITY = int(DEFAULT_HISTORY_SECONDS / FEEDBACK_PERIOD)
+
+
+class TelemetryRingBuffer:
+    """
+    Fixed-capacity history of the feedback packets, stored in one preallocated
+    NumPy array of dtype MyType. When full, the oldest packets are overwritten.
+
+    Writes come from the feedback reader thread, reads (post-mortem analysis, plots)
+    from any thread: accessors always return chronological copies.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("La capacità del buffer deve essere positiva")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=MyType)
+        self._received_at = np.zeros(capacity, dtype=np.float64)    # time.monotonic() at reception
+        self._head = 0      # index of the next write
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, packets: np.ndarray, received_at: Optional[float] = None):
+        """
+        Append one or more MyType packets (array of shape (k,)) to the history.
+        `received_at` is the reception time shared by the whole batch.
+        """
+        packets = np.atleast_1d(packets)
+        if received_at is None:
+            received_at = time.monotonic()
+        # Only the newest `capacity` packets can fit
+        if len(packets) > self.capacity:
+            packets = packets[-self.capacity:]
+        k = len(packets)
+        if k == 0:
+            return
+
+        with self._lock:
+            first = min(k, self.capacity - self._head)
+            self._data[self._head:self._head + first] = packets[:first]
+            self._received_at[self._head:self._head + first] = received_at
+            if first < k:   # wrap-around
+                self._data[:k - first] = packets[first:]
+                self._received_at[:k - first] = received_at
+            self._head = (self._head + k) % self.capacity
+            self._count = min(self._count + k, self.capacity)
+
+    def clear(self):
+        """Drop all the stored packets."""
+        with self._lock:
+            self._head = 0
+            self._count = 0
+
+    def _chronological_indices(self, seconds: Optional[float]) -> np.ndarray:
+        start = (self._head - self._count) % self.capacity
+        idx = (start + np.arange(self._count)) % self.capacity
+        if seconds is not None and self._count:
+            times = self._received_at[idx]
+            idx = idx[times >= times[-1] - seconds]
+        return idx
+
+    def history(self, seconds: Optional[float] = None) -> np.ndarray:
+        """
+        Return a chronological copy of the stored packets.
+
+        Args:
+            seconds: if given, only the packets received in the last `seconds` seconds
+                (relative to the newest packet).
+        """
+        with self._lock:
+            return self._data[self._chronological_indices(seconds)]
+
+    def history_with_times(self, seconds: Optional[float] = None) -> tuple:
+        """
+        Return (reception times (N,), packets (N,)) taken consistently under the same lock,
+        e.g. to associate other timestamped data (camera frames) with the nearest packet.
+        """
+        with self._lock:
+            idx = self._chronological_indices(seconds)
+            return self._received_at[idx], self._data[idx]
+
+    def _field(self, name: str, seconds: Optional[float]) -> np.ndarray:
+        with self._lock:
+            return self._data[name][self._chronological_indices(seconds)]
+
+    def received_times(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Reception times (time.monotonic()) of the stored packets, shape (N,)."""
+        with self._lock:
+            return self._received_at[self._chronological_indices(seconds)]
+
+    def controller_timestamps(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Controller `time_stamp` field of the stored packets, shape (N,)."""
+        return self._field('time_stamp', seconds)
+
+    def joint_trajectory(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Actual joint angles `q_actual` (deg), shape (N, 6)."""
+        return self._field('q_actual', seconds)
+
+    def tcp_path(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Actual TCP pose `tool_vector_actual` [x, y, z, rx, ry, rz], shape (N, 6)."""
+        return self._field('tool_vector_actual', seconds)
+
+    def motor_temperatures(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Motor temperatures of the six joints, shape (N, 6)."""
+        return self._field('motor_temperatures', seconds)
+
+    def currents(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Actual joint currents `i_actual`, shape (N, 6)."""
+        return self._field('i_actual', seconds)
+
+    def target_currents(self, seconds: Optional[float] = None) -> np.ndarray:
+        """Target joint currents `i_target`, shape (N, 6)."""
+        return self._field('i_target', seconds)
+
+    def dump(self, path: str, seconds: Optional[float] = None):
+        """
+        Save the history to a .npy file for post-mortem analysis (e.g. after a collision).
+        The file can be reloaded with `np.load(path)` and keeps the MyType dtype.
+        """
+        np.save(path, self.history(seconds))
@@ -0,0 +1,279 @@
+# telemetry_log.py
+
+import atexit
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Iterable, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from dobot_api import MyType
+
+MAGIC = b"DOBOTTLM"
+VERSION = 1
+HEADER_ALIGN = 256              # the records start at a multiple of this offset
+INDEX_EVERY = 1024              # one index entry every 1024 records (about 8 s of feedback)
+FLUSH_INTERVAL = 1.0            # s between two writes of the buffered records to disk
+WRITE_BUFFER = 256 * 1024       # bytes of the file buffer
+TIME_FIELD = "received_at"      # reception time (Unix epoch seconds) added to every record
+_PREFIX = struct.Struct("<8sII")    # magic, version, header size
+
+# Fields logged by default: enough to replay trajectories, currents and states without the whole 1440 byte packet
+DEFAULT_FIELDS = (
+    'time_stamp', 'robot_mode', 'q_actual', 'qd_actual', 'i_actual', 'tool_vector_actual',
+    'TCP_speed_actual', 'motor_temperatures', 'run_queued_cmd', 'enable_status', 'error_status',
+)
+IndexType = np.dtype([('record', '<i8'), (TIME_FIELD, '<f8')])
+
+TimeLike = Union[float, datetime, None]
+
+
+def record_dtype(fields: Optional[Sequence[str]] = None) -> np.dtype:
+    """Packed record layout: the reception time followed by the chosen MyType fields (None = all)."""
+    fields = MyType.names if fields is None else tuple(fields)
+    unknown = [f for f in fields if f not in MyType.names]
+    if unknown:
+        raise ValueError(f"Campi non presenti in MyType: {unknown}")
+    return np.dtype([(TIME_FIELD, '<f8')] + [(f, MyType.fields[f][0]) for f in fields])
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+class TelemetryHeader(NamedTuple):
+    fields: tuple
+    dtype: np.dtype
+    index_every: int
+    created: float              # Unix epoch seconds
+    header_size: int
+
+
+def _header_bytes(fields: tuple, index_every: int, created: float) -> bytes:
+    meta = json.dumps({"fields": list(fields), "record_size": record_dtype(fields).itemsize,
+                       "index_every": index_every, "created": created}).encode('utf-8')
+    size = -(-(_PREFIX.size + len(meta) + 1) // HEADER_ALIGN) * HEADER_ALIGN
+    return (_PREFIX.pack(MAGIC, VERSION, size) + meta + b"\n").ljust(size, b" ")
+
+
+def read_header(path: str) -> TelemetryHeader:
+    """Parse the header of a telemetry log."""
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f"{path}: header del log di telemetria troncato")
+        magic, version, size = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f"{path} non è un log di telemetria")
+        if version != VERSION:
+            raise ValueError(f"{path}: versione {version} del log di telemetria non supportata")
+        meta = json.loads(f.read(size - _PREFIX.size).decode('utf-8'))
+    fields = tuple(meta["fields"])
+    dtype = record_dtype(fields)
+    if dtype.itemsize != meta["record_size"]:
+        raise ValueError(f"{path}: il layout di MyType è cambiato rispetto al log")
+    return TelemetryHeader(fields, dtype, int(meta["index_every"]), float(meta["created"]), size)
+
+
+class TelemetryLog:
+    """
+    Append-only binary log of the feedback packets, for offline analysis of the 8 ms telemetry.
+
+    The file is a small header (magic, version, JSON with the logged fields) followed by packed
+    records: the reception time as Unix epoch seconds and the chosen MyType fields, so a log of
+    the default fields takes 315 bytes per packet instead of 1440. Every index_every records
+    the position and time of the record are appended to the <path>.idx sidecar, which lets the
+    reader find a time range without touching the records before it.
+
+    Records go through a file buffer and are written to disk every FLUSH_INTERVAL seconds, so a
+    crash loses at most the last interval; a truncated last record is discarded on reopening.
+    Opening an existing log with the same fields continues it.
+    """
+
+    def __init__(self, path: str, fields: Optional[Sequence[str]] = DEFAULT_FIELDS,
+                 index_every: int = INDEX_EVERY, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # Reception times of FeedbackReader are time.monotonic(), the log stores wall clock times
+        self._epoch_offset = time.time() - time.monotonic()
+        fields = MyType.names if fields is None else tuple(fields)
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            header = read_header(path)
+            if header.fields != fields:
+                raise ValueError(f"{path}: il log esistente contiene campi diversi da quelli richiesti")
+            self.header = header
+            self.count = (os.path.getsize(path) - header.header_size) // header.dtype.itemsize
+            self._file = open(path, 'r+b', buffering=WRITE_BUFFER)
+            self._file.truncate(header.header_size + self.count * header.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+            self._trim_index()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            created = time.time()
+            data = _header_bytes(fields, index_every, created)
+            self.header = TelemetryHeader(fields, record_dtype(fields), index_every, created, len(data))
+            self.count = 0
+            self._file = open(path, 'wb', buffering=WRITE_BUFFER)
+            self._file.write(data)
+        self.dtype = self.header.dtype
+        self._index = open(index_path(path), 'ab')
+        self._last_flush = time.monotonic()
+        atexit.register(self.close)
+
+    def _trim_index(self):
+        """Drop the index entries of records lost in a crash, so the index stays sorted when the log continues."""
+        path = index_path(self.path)
+        if not os.path.exists(path):
+            return
+        index = np.fromfile(path, dtype=IndexType, count=os.path.getsize(path) // IndexType.itemsize)
+        keep = int(np.count_nonzero(index['record'] < self.count))
+        with open(path, 'r+b') as f:
+            f.truncate(keep * IndexType.itemsize)
+
+    @classmethod
+    def for_run(cls, directory: str, **kwargs) -> "TelemetryLog":
+        """New log named telemetry_YYYYmmdd_HHMMSS.tlm in the given directory."""
+        name = datetime.now().strftime("telemetry_%Y%m%d_%H%M%S.tlm")
+        return cls(os.path.join(directory, name), **kwargs)
+
+    def append(self, packets: np.ndarray, received_at: Optional[float] = None):
+        """
+        Append one or more MyType packets (array of shape (k,)), received at time.monotonic()
+        `received_at` (now if None). Called from the feedback reader thread.
+        """
+        packets = np.atleast_1d(packets)
+        k = len(packets)
+        if k == 0:
+            return
+        records = np.empty(k, dtype=self.dtype)
+        records[TIME_FIELD] = (time.monotonic() if received_at is None else received_at) + self._epoch_offset
+        for name in self.header.fields:
+            records[name] = packets[name]
+
+        with self._lock:
+            if self._file.closed:
+                return
+            every = self.header.index_every
+            first = -(-self.count // every) * every      # first indexed record of this batch
+            if first < self.count + k:
+                entries = np.empty(len(range(first, self.count + k, every)), dtype=IndexType)
+                entries['record'] = np.arange(first, self.count + k, every)
+                entries[TIME_FIELD] = records[TIME_FIELD][entries['record'] - self.count]
+                self._index.write(entries.tobytes())
+            self._file.write(records.tobytes())
+            self.count += k
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        self._file.flush()
+        self._index.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the buffered records to disk."""
+        with self._lock:
+            if not self._file.closed:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _to_epoch(t: TimeLike) -> Optional[float]:
+    return t.timestamp() if isinstance(t, datetime) else t
+
+
+class TelemetryLogReader:
+    """
+    Memory-mapped reader of a telemetry log. Records are only loaded when accessed, so a time
+    range of a long log costs a search in the index and the pages of that range.
+
+        log = TelemetryLogReader(path)
+        rec = log.read(start=t0, end=t0 + 5)      # structured array, e.g. rec['q_actual']
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = read_header(path)
+        self.dtype = self.header.dtype
+        count = (os.path.getsize(path) - self.header.header_size) // self.dtype.itemsize
+        self.records = np.memmap(path, dtype=self.dtype, mode='r', offset=self.header.header_size,
+                                 shape=(count,)) if count else np.empty(0, dtype=self.dtype)
+        self.index = self._load_index(count)
+
+    def _load_index(self, count: int) -> np.ndarray:
+        path = index_path(self.path)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=IndexType)
+        index = np.fromfile(path, dtype=IndexType, count=os.path.getsize(path) // IndexType.itemsize)
+        return index[index['record'] < count]    # entries of records lost in a crash
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def fields(self) -> tuple:
+        return self.header.fields
+
+    def _position(self, t: float, side: str) -> int:
+        """Position of time t among the records, narrowed with the index before the binary search."""
+        lo, hi = 0, len(self.records)
+        if len(self.index):
+            i = np.searchsorted(self.index[TIME_FIELD], t, side=side)
+            if i > 0:
+                lo = int(self.index['record'][i - 1])
+            if i < len(self.index):
+                hi = int(self.index['record'][i])
+        return lo + int(np.searchsorted(self.records[TIME_FIELD][lo:hi], t, side=side))
+
+    def slice(self, start: TimeLike = None, end: TimeLike = None) -> slice:
+        """Record positions with start <= received_at < end (epoch seconds or datetime, None = open)."""
+        start, end = _to_epoch(start), _to_epoch(end)
+        lo = 0 if start is None else self._position(start, 'left')
+        hi = len(self.records) if end is None else self._position(end, 'left')
+        return slice(lo, max(lo, hi))
+
+    def read(self, start: TimeLike = None, end: TimeLike = None,
+             fields: Optional[Iterable[str]] = None) -> np.ndarray:
+        """
+        Records received in [start, end), as a memory-mapped view (no copy).
+        With fields, only those columns (plus received_at) are returned.
+        """
+        records = self.records[self.slice(start, end)]
+        if fields is not None:
+            records = records[[TIME_FIELD] + [f for f in fields if f != TIME_FIELD]]
+        return records
+
+    def times(self, start: TimeLike = None, end: TimeLike = None) -> np.ndarray:
+        """Reception times (epoch seconds) of the records in [start, end)."""
+        return self.records[TIME_FIELD][self.slice(start, end)]
+
+    def time_range(self) -> tuple:
+        """(first, last) reception time, or (None, None) for an empty log."""
+        if not len(self.records):
+            return None, None
+        return float(self.records[TIME_FIELD][0]), float(self.records[TIME_FIELD][-1])
+
+
+def read_telemetry(path: str, start: TimeLike = None, end: TimeLike = None,
+                   fields: Optional[Iterable[str]] = None) -> np.ndarray:
+    """Shortcut for TelemetryLogReader(path).read(start, end, fields)."""
+    return TelemetryLogReader(path).read(start, end, fields)
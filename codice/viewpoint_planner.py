@@ -0,0 +1,163 @@
+# viewpoint_planner.py
+
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+import kinematics
+from workspace import check_poses
+
+TOP_VIEW_HEIGHT = 350.0     # mm above the top of the plant
+TOP_VIEW_ORIENTATION = [-180.0, 0.0, 180.0]
+
+# Orbit views calibrated on the bench: azimuth of the camera around the plant (deg, from +x),
+# horizontal distance from the plant axis (mm), height above the top of the plant (mm) and rx (deg).
+# Views at other azimuths are interpolated; rz always points the camera back to the plant (azimuth + 90).
+ORBIT_AZIMUTHS = np.array([0.0, 90.0, 180.0, 270.0])
+ORBIT_RADII = np.array([214.0, 240.0, 243.0, 246.0])
+ORBIT_HEIGHTS = np.array([305.0, 285.0, 285.0, 285.0])
+ORBIT_RX = np.array([-151.0, -141.0, -141.0, -141.0])
+
+
+class ViewpointPlan(NamedTuple):
+    """Scan path computed by plan_viewpoints."""
+    waypoints: np.ndarray       # (M, 6) poses to visit, in order
+    joints: np.ndarray          # (M, 6) joint solutions of the waypoints
+    azimuths: np.ndarray        # (M,) azimuth of each waypoint, NaN for the top view
+    skipped: list               # [(azimuth, reasons)] orbit views discarded as unreachable
+
+
+def top_viewpoint(bbox) -> np.ndarray:
+    """
+    Pose above the plant, looking down. bbox is YOLO absolute [cx, cy, cz, w, d, h] in mm,
+    or an (N, 6) array of them (one pose per row).
+    """
+    bbox = np.asarray(bbox, dtype=float)
+    z_max = bbox[..., 2] + bbox[..., 5] / 2
+    orientation = np.broadcast_to(TOP_VIEW_ORIENTATION, bbox.shape[:-1] + (3,))
+    return np.concatenate([bbox[..., :2], (z_max + TOP_VIEW_HEIGHT)[..., None], orientation], axis=-1)
+
+
+def orbit_viewpoints(bbox, n_views: int, start_azimuth: float = 0.0) -> tuple:
+    """
+    Compute n_views poses evenly spaced around the plant, starting from start_azimuth.
+    With n_views=4 and start_azimuth=0 these are the four calibrated side views.
+
+    Returns:
+        (poses (n_views, 6), azimuths (n_views,)) with azimuths in [0, 360).
+    """
+    azimuths = (start_azimuth + 360.0 * np.arange(n_views) / n_views) % 360.0
+    radii = np.interp(azimuths, ORBIT_AZIMUTHS, ORBIT_RADII, period=360.0)
+    heights = np.interp(azimuths, ORBIT_AZIMUTHS, ORBIT_HEIGHTS, period=360.0)
+    rx = np.interp(azimuths, ORBIT_AZIMUTHS, ORBIT_RX, period=360.0)
+    rz = (azimuths + 90.0 + 180.0) % 360.0 - 180.0
+
+    a = np.radians(azimuths)
+    z_max = bbox[2] + bbox[5] / 2
+    poses = np.column_stack([
+        bbox[0] + radii * np.cos(a),
+        bbox[1] + radii * np.sin(a),
+        z_max + heights,
+        rx,
+        np.zeros(n_views),
+        rz,
+    ])
+    return poses, azimuths
+
+
+def joint_travel(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise joint-space travel between two sets of configurations (N, 6) and (M, 6),
+    measured as the largest single-joint rotation (the slowest joint bounds a JointMovJ).
+    """
+    return np.abs(a[:, None, :] - b[None, :, :]).max(axis=2)
+
+
+def order_by_joint_travel(joints: np.ndarray, start: Optional[np.ndarray] = None) -> List[int]:
+    """
+    Order configurations (N, 6) to minimise the total joint travel of an open path starting
+    from `start` (or from joints[0] if start is None): nearest neighbour followed by 2-opt.
+    Returns the visiting order as indices into joints.
+    """
+    n = len(joints)
+    if n <= 1:
+        return list(range(n))
+    nodes = joints if start is None else np.vstack([start, joints])
+    dist = joint_travel(nodes, nodes)
+
+    # Nearest neighbour from the start node
+    path = [0]
+    remaining = set(range(1, len(nodes)))
+    while remaining:
+        last = path[-1]
+        nxt = min(sorted(remaining), key=lambda j: dist[last, j])
+        path.append(nxt)
+        remaining.remove(nxt)
+
+    # 2-opt on the open path (the start node stays first)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 1):
+            for k in range(i + 1, len(path)):
+                before = dist[path[i - 1], path[i]] + (dist[path[k], path[k + 1]] if k + 1 < len(path) else 0.0)
+                after = dist[path[i - 1], path[k]] + (dist[path[i], path[k + 1]] if k + 1 < len(path) else 0.0)
+                if after + 1e-9 < before:
+                    path[i:k + 1] = path[i:k + 1][::-1]
+                    improved = True
+
+    if start is None:
+        return path
+    return [p - 1 for p in path[1:]]
+
+
+def plan_viewpoints(bbox, n_views: int = 4, seed=None, solver: Optional[kinematics.KinematicsSolver] = None,
+                    start_azimuth: float = 0.0, return_to_top: bool = True) -> ViewpointPlan:
+    """
+    Plan the scan of a plant at any position on the bench: one top view plus n_views orbit views
+    at arbitrary azimuths, obtained by rotating the calibrated offsets around the plant.
+    Unreachable orbit views are dropped (and reported in `skipped`), the others are ordered to
+    minimise joint travel starting from the top view.
+
+    Args:
+        bbox: YOLO absolute bbox [cx, cy, cz, width, depth, height] in mm, robot base frame.
+        n_views: number of orbit views; fewer views means a shorter scan.
+        seed: current joints (deg), used to choose the IK configurations.
+        solver: optional KinematicsSolver, to reuse its IK cache.
+        start_azimuth: azimuth of the first orbit view (deg).
+        return_to_top: if True the arm goes back to the top view between two orbit views, as in the
+            original scan path; if False it moves directly from one orbit view to the next.
+    """
+    top = top_viewpoint(bbox)
+    orbit, azimuths = orbit_viewpoints(bbox, n_views, start_azimuth)
+
+    check = check_poses(np.vstack([top, orbit]), seed=seed, solver=solver)
+    if not check.ok[0]:
+        return ViewpointPlan(np.empty((0, 6)), np.empty((0, 6)), np.empty(0),
+                             [(float('nan'), check.reasons[0])])
+
+    top_joints = check.joints[0]
+    ok = check.ok[1:]
+    skipped = [(float(azimuths[i]), check.reasons[i + 1]) for i in np.flatnonzero(~ok)]
+    orbit, azimuths = orbit[ok], azimuths[ok]
+    # Joints of the orbit views chosen close to the top view, so the ordering sees a consistent configuration
+    orbit_joints = np.empty((0, 6))
+    if len(orbit):
+        orbit_joints = kinematics.select_solution(
+            solver.inverse_all(orbit) if solver is not None else kinematics.inverse_all(orbit), top_joints)
+    order = order_by_joint_travel(orbit_joints, start=top_joints)
+
+    waypoints, joints, azs = [top], [top_joints], [np.nan]
+    for idx in order:
+        waypoints.append(orbit[idx])
+        joints.append(orbit_joints[idx])
+        azs.append(azimuths[idx])
+        if return_to_top:
+            waypoints.append(top)
+            joints.append(top_joints)
+            azs.append(np.nan)
+    if not return_to_top and len(order):
+        waypoints.append(top)
+        joints.append(top_joints)
+        azs.append(np.nan)
+    return ViewpointPlan(np.array(waypoints), np.array(joints), np.array(azs), skipped)
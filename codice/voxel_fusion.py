@@ -0,0 +1,162 @@
+# voxel_fusion.py
+
+from typing import Optional, Union
+
+import numpy as np
+
+import ply_io
+from ply_io import PlantVertexType
+
+DEFAULT_VOXEL_SIZE = 0.005      # m (the ZED point clouds are in metres), about the point spacing of the recorded clouds
+AUTO_VOXEL_SIZE = "auto"        # derive the voxel from the point spacing of the cloud
+SPACING_FACTOR = 2.0            # auto voxel = SPACING_FACTOR * median nearest-neighbour spacing
+SPACING_SAMPLES = 512           # points sampled to estimate the spacing
+_HASH_BITS = 21                 # bits per axis of the voxel hash
+_HASH_OFFSET = 1 << (_HASH_BITS - 1)
+
+
+def voxel_keys(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    """Hash of the voxel containing each point (N, 3) -> (N,) int64, 21 bits per axis."""
+    idx = np.floor(points / voxel_size).astype(np.int64) + _HASH_OFFSET
+    if (idx < 0).any() or (idx >= 1 << _HASH_BITS).any():
+        raise ValueError("Punti fuori dall'estensione della griglia: aumentare la dimensione dei voxel")
+    return (idx[:, 0] << (2 * _HASH_BITS)) | (idx[:, 1] << _HASH_BITS) | idx[:, 2]
+
+
+def estimate_spacing(points, samples: int = SPACING_SAMPLES, seed: int = 0) -> float:
+    """
+    Median nearest-neighbour distance of a cloud (N, 3), estimated on a random sample of points
+    (brute force in chunks, so memory stays bounded). Returns NaN for fewer than two points.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    points = points[np.isfinite(points).all(axis=1)]
+    if len(points) < 2:
+        return float('nan')
+    rng = np.random.default_rng(seed)
+    query = points[rng.choice(len(points), min(samples, len(points)), replace=False)]
+    chunk = max(1, int(4_000_000 // len(points)))     # about 100 MB of distances per chunk
+    nearest = []
+    for start in range(0, len(query), chunk):
+        d = ((query[start:start + chunk, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+        d[d == 0] = np.inf          # the point itself and exact duplicates
+        nearest.append(d.min(axis=1))
+    nearest = np.concatenate(nearest)
+    nearest = nearest[np.isfinite(nearest)]
+    return float(np.sqrt(np.median(nearest))) if len(nearest) else float('nan')
+
+
+class VoxelGrid:
+    """
+    Incremental fusion of point cloud frames on a hashed voxel grid: every voxel keeps the sums
+    of the positions, colours and normals of the points that fall in it, so the fused cloud has
+    one averaged point per occupied voxel and memory grows with the scanned surface, not with
+    the number of frames.
+
+    The voxel hashes are kept sorted and new frames are merged with a vectorised searchsorted.
+    """
+
+    def __init__(self, voxel_size: float = DEFAULT_VOXEL_SIZE):
+        if voxel_size <= 0:
+            raise ValueError("La dimensione dei voxel deve essere positiva")
+        self.voxel_size = voxel_size
+        self._keys = np.empty(0, dtype=np.int64)
+        self._count = np.empty(0, dtype=np.int64)
+        self._xyz = np.empty((0, 3))
+        self._rgb = np.empty((0, 3))
+        self._normal = np.empty((0, 3))
+        self.frames = 0
+        self.points = 0             # points integrated so far
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def integrate(self, points, colors=None, normals=None):
+        """
+        Add one frame: points (N, 3), optional colours (N, 3) 0-255 and normals (N, 3).
+        Points with NaN/inf coordinates (no depth) are skipped.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        valid = np.isfinite(points).all(axis=1)
+        points = points[valid]
+        colors = np.zeros_like(points) if colors is None else np.asarray(colors, dtype=np.float64).reshape(-1, 3)[valid]
+        normals = np.zeros_like(points) if normals is None else np.asarray(normals, dtype=np.float64).reshape(-1, 3)[valid]
+        normals = np.nan_to_num(normals)
+        self.frames += 1
+        if len(points) == 0:
+            return
+
+        # Reduce the frame to one accumulator per voxel
+        keys, inverse = np.unique(voxel_keys(points, self.voxel_size), return_inverse=True)
+        count = np.bincount(inverse, minlength=len(keys))
+        sums = [np.stack([np.bincount(inverse, a[:, i], len(keys)) for i in range(3)], axis=1)
+                for a in (points, colors, normals)]
+
+        # Merge with the voxels already in the grid
+        pos = np.searchsorted(self._keys, keys)
+        found = pos < len(self._keys)
+        found[found] = self._keys[pos[found]] == keys[found]
+        old = pos[found]
+        self._count[old] += count[found]
+        for acc, s in zip((self._xyz, self._rgb, self._normal), sums):
+            acc[old] += s[found]
+
+        new = ~found
+        if new.any():
+            merged = np.concatenate([self._keys, keys[new]])
+            order = np.argsort(merged, kind='stable')
+            self._keys = merged[order]
+            self._count = np.concatenate([self._count, count[new]])[order]
+            self._xyz, self._rgb, self._normal = (
+                np.concatenate([acc, s[new]])[order] for acc, s in zip((self._xyz, self._rgb, self._normal), sums))
+        self.points += len(points)
+
+    def integrate_vertices(self, vertices: np.ndarray):
+        """Add one frame given as a structured vertex array (x, y, z[, nx, ny, nz][, red, green, blue])."""
+        names = vertices.dtype.names
+        xyz = np.column_stack([vertices['x'], vertices['y'], vertices['z']])
+        rgb = np.column_stack([vertices['red'], vertices['green'], vertices['blue']]) if 'red' in names else None
+        nrm = np.column_stack([vertices['nx'], vertices['ny'], vertices['nz']]) if 'nx' in names else None
+        self.integrate(xyz, rgb, nrm)
+
+    def to_vertices(self) -> np.ndarray:
+        """Fused cloud: one point per voxel with averaged position and colour and renormalised normal."""
+        out = np.empty(len(self), dtype=PlantVertexType)
+        if len(self) == 0:
+            return out
+        n = self._count[:, None].astype(np.float64)
+        xyz = self._xyz / n
+        rgb = np.clip(np.rint(self._rgb / n), 0, 255)
+        norm = np.linalg.norm(self._normal, axis=1, keepdims=True)
+        normal = np.divide(self._normal, norm, out=np.zeros_like(self._normal), where=norm > 0)
+        for i, axis in enumerate('xyz'):
+            out[axis] = xyz[:, i]
+            out['n' + axis] = normal[:, i]
+        for i, channel in enumerate(('red', 'green', 'blue')):
+            out[channel] = rgb[:, i]
+        return out
+
+    def save(self, path: str):
+        """Write the fused cloud as binary PLY."""
+        ply_io.write_ply(path, self.to_vertices())
+
+    def clear(self):
+        self.__init__(self.voxel_size)
+
+
+def downsample_ply(path: str, out_path: str, voxel_size: Union[float, str] = DEFAULT_VOXEL_SIZE,
+                   chunk_vertices: int = ply_io.CHUNK_VERTICES, grid: Optional[VoxelGrid] = None) -> VoxelGrid:
+    """
+    Fuse a recorded point cloud file into a voxel grid, streaming it in chunks (memory-mapped when
+    binary), and save the result to out_path. Pass an existing grid to fuse several files together.
+    With voxel_size AUTO_VOXEL_SIZE the voxel is SPACING_FACTOR times the point spacing of the file.
+    """
+    vertices = ply_io.read_ply(path)
+    if grid is None:
+        if voxel_size == AUTO_VOXEL_SIZE:
+            spacing = estimate_spacing(np.column_stack([vertices['x'], vertices['y'], vertices['z']]))
+            voxel_size = SPACING_FACTOR * spacing if np.isfinite(spacing) else DEFAULT_VOXEL_SIZE
+        grid = VoxelGrid(voxel_size)
+    for start in range(0, len(vertices), chunk_vertices):
+        grid.integrate_vertices(np.asarray(vertices[start:start + chunk_vertices]))
+    grid.save(out_path)
+    return grid
@@ -0,0 +1,80 @@
+# workspace.py
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+import kinematics
+
+MAX_REACH = 900.0               # mm, radius of the reachable sphere around the base
+TABLE_Z = 0.0                   # mm, height of the work plane in the base frame
+WRIST_SINGULARITY_MARGIN = 5.0  # deg, min |J5| distance from 0/180
+ELBOW_SINGULARITY_MARGIN = 5.0  # deg, min |J3| distance from 0 (arm fully stretched)
+SHOULDER_SINGULARITY_MARGIN = 50.0  # mm, min distance of the wrist centre from the J1 axis
+
+# Reasons reported for rejected poses
+REASON_REACH = "fuori portata"
+REASON_TABLE = "sotto il piano di lavoro"
+REASON_NO_IK = "nessuna soluzione cinematica"
+REASON_JOINT_LIMITS = "limiti dei giunti"
+REASON_WRIST = "singolarità del polso"
+REASON_ELBOW = "singolarità del gomito"
+REASON_SHOULDER = "singolarità della spalla"
+
+
+class WorkspaceCheck(NamedTuple):
+    """Result of check_poses for N poses."""
+    ok: np.ndarray              # (N,) bool, True if the pose can be reached safely
+    joints: np.ndarray          # (N, 6) chosen joint solution (deg), NaN if none
+    reasons: list               # N lists of rejection reasons (empty if ok)
+
+    def rejected(self) -> list:
+        """Indices of the rejected poses."""
+        return np.flatnonzero(~self.ok).tolist()
+
+
+def check_poses(poses, seed=None, solver: Optional[kinematics.KinematicsSolver] = None,
+                table_z: float = TABLE_Z, max_reach: float = MAX_REACH) -> WorkspaceCheck:
+    """
+    Validate a batch of Dobot poses (N, 6) [x, y, z, rx, ry, rz] in a single vectorised pass against
+    reach, table plane, joint limits and singularity margins.
+
+    Args:
+        poses: array-like (N, 6) or (6,) of poses in mm/deg.
+        seed: joint angles (deg) used to choose among the IK configurations (e.g. the current joints).
+        solver: optional KinematicsSolver, to reuse its IK cache.
+        table_z: height of the work plane; the TCP must stay above it.
+        max_reach: radius of the reachable sphere around the base.
+    """
+    poses = np.atleast_2d(np.asarray(poses, dtype=float))
+
+    out_of_reach = np.einsum('ij,ij->i', poses[:, :3], poses[:, :3]) > max_reach ** 2
+    under_table = poses[:, 2] < table_z
+
+    solutions = solver.inverse_all(poses) if solver is not None else kinematics.inverse_all(poses)
+    no_ik = ~np.isfinite(solutions).all(axis=2).any(axis=1)
+    joints = kinematics.select_solution(solutions, seed)
+    no_joints = ~np.isfinite(joints).all(axis=1)
+    joint_limits = no_joints & ~no_ik
+
+    with np.errstate(invalid='ignore'):
+        q = np.radians(joints)
+        wrist = np.abs(np.sin(q[:, 4])) < np.sin(np.radians(WRIST_SINGULARITY_MARGIN))
+        elbow = np.abs(np.sin(q[:, 2])) < np.sin(np.radians(ELBOW_SINGULARITY_MARGIN))
+    T = kinematics.pose_to_matrix(poses)
+    wrist_centre = T[:, :3, 3] - kinematics.CR5_D[5] * T[:, :3, 2]
+    shoulder = np.hypot(wrist_centre[:, 0], wrist_centre[:, 1]) < SHOULDER_SINGULARITY_MARGIN
+
+    checks = [
+        (out_of_reach, REASON_REACH),
+        (under_table, REASON_TABLE),
+        (no_ik, REASON_NO_IK),
+        (joint_limits, REASON_JOINT_LIMITS),
+        (wrist & ~no_joints, REASON_WRIST),
+        (elbow & ~no_joints, REASON_ELBOW),
+        (shoulder, REASON_SHOULDER),
+    ]
+    failed = np.column_stack([mask for mask, _ in checks])
+    labels = [label for _, label in checks]
+    reasons = [[labels[j] for j in np.flatnonzero(row)] for row in failed]
+    return WorkspaceCheck(ok=~failed.any(axis=1), joints=joints, reasons=reasons)